@@ -0,0 +1,197 @@
+import os
+import mmap
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavHeader(NamedTuple):
+    rate: int
+    channels: int
+    format_tag: int
+    bits_per_sample: int
+    block_align: int
+    data_offset: int
+    n_frames: int
+
+    @property
+    def duration(self):
+        return self.n_frames / self.rate
+
+    @property
+    def dtype(self):
+        """
+        numpy dtype of the samples (or None if the samples can not be mapped directly, e.g. 24 bit pcm)
+        """
+        if self.format_tag == WAVE_FORMAT_PCM:
+            return {8: np.dtype("u1"), 16: np.dtype("<i2"), 32: np.dtype("<i4"), 64: np.dtype("<i8")}.get(
+                self.bits_per_sample
+            )
+        if self.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            return {32: np.dtype("<f4"), 64: np.dtype("<f8")}.get(self.bits_per_sample)
+        return None
+
+
+def read_wav_header(fpath):
+    """
+    Parse the RIFF header of a wav file and return a `WavHeader` (or None if the file is not a wav file which can
+    be handled here). Only the header is read.
+    """
+
+    file_size = os.path.getsize(fpath)
+    fmt = None
+    with open(fpath, "rb") as fp:
+        riff_header = fp.read(12)
+        if len(riff_header) < 12 or riff_header[:4] != b"RIFF" or riff_header[8:12] != b"WAVE":
+            return None
+
+        while True:
+            chunk_header = fp.read(8)
+            if len(chunk_header) < 8:
+                return None
+            chunk_id = chunk_header[:4]
+            chunk_size = struct.unpack("<I", chunk_header[4:])[0]
+
+            if chunk_id == b"fmt ":
+                fmt_data = fp.read(chunk_size)
+                if len(fmt_data) < 16:
+                    return None
+                format_tag, channels, rate, _, block_align, bits_per_sample = struct.unpack("<HHIIHH", fmt_data[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt_data) >= 26:
+                    # the first two bytes of the sub format guid are the actual format tag
+                    format_tag = struct.unpack("<H", fmt_data[24:26])[0]
+                fmt = (format_tag, channels, rate, block_align, bits_per_sample)
+                fp.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                format_tag, channels, rate, block_align, bits_per_sample = fmt
+                if rate == 0 or block_align == 0 or channels == 0:
+                    return None
+
+                # the size might be missing or wrong (e.g. after an interrupted recording)
+                data_offset = fp.tell()
+                available_size = file_size - data_offset
+                if chunk_size == 0 or chunk_size > available_size:
+                    chunk_size = available_size
+                return WavHeader(
+                    rate, channels, format_tag, bits_per_sample, block_align, data_offset, chunk_size // block_align
+                )
+            else:
+                # chunks are word-aligned
+                fp.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+
+def read_wav_mmap(fpath):
+    """
+    Return (rate, data) where data is a read-only numpy memmap of the samples (no copy of the file content).
+    The shape is (n_frames,) for mono and (n_frames, channels) otherwise (same as `scipy.io.wavfile.read`);
+    use `mono_view` to get one channel without a copy.
+    """
+    header = read_wav_header(fpath)
+    dtype = header.dtype if header is not None else None
+    if dtype is None or dtype.itemsize * header.channels != header.block_align:
+        # formats which can not be mapped (e.g. 24 bit pcm) are read completely
+        from scipy.io import wavfile
+
+        return wavfile.read(fpath)
+
+    shape = (header.n_frames,) if header.channels == 1 else (header.n_frames, header.channels)
+    if header.n_frames == 0:
+        # an empty range can not be mapped
+        return header.rate, np.zeros(shape, dtype=dtype)
+    return header.rate, np.memmap(fpath, dtype=dtype, mode="r", offset=header.data_offset, shape=shape)
+
+
+def write_wav(fpath, rate, data):
+    from scipy.io import wavfile
+
+    wavfile.write(fpath, rate, data)
+
+
+def mono_view(audio_data):
+    """
+    Return the first channel of (possibly) multi channel audio data as a view (no copy).
+    """
+    if len(audio_data.shape) == 2:
+        return audio_data[:, 0]
+    return audio_data
+
+
+def release_pages(audio_data):
+    """
+    Tell the os that the already read pages of a memmap (or a view of it) are not needed anymore.
+    They stay in the page cache and are read again on access. This keeps the resident memory of a process
+    constant while it walks through a long file.
+    """
+    base = audio_data
+    while base is not None and not isinstance(base, mmap.mmap):
+        base = getattr(base, "base", None)
+    if base is not None and hasattr(mmap, "MADV_DONTNEED"):
+        base.madvise(mmap.MADV_DONTNEED)
+
+
+class WavWriter:
+    """
+    Write a mono float32 wav file block by block (the sizes in the header are fixed on `close`).
+
+    The file layout is the same as that of `scipy.io.wavfile.write` for float32 data.
+    """
+
+    header_struct = struct.Struct("<4sI4s4sIHHIIHHH4sII4sI")
+
+    def __init__(self, fpath, rate):
+        self.fpath = fpath
+        self.rate = rate
+        self.n_frames = 0
+        self.fp = open(fpath, "wb")
+        self._write_header()
+
+    def _write_header(self):
+        channels = 1
+        sample_size = 4
+        header = self.header_struct.pack(
+            b"RIFF",
+            self.header_struct.size - 8 + self.n_frames * sample_size,
+            b"WAVE",
+            b"fmt ",
+            18,
+            3,  # WAVE_FORMAT_IEEE_FLOAT
+            channels,
+            self.rate,
+            self.rate * channels * sample_size,
+            channels * sample_size,
+            8 * sample_size,
+            0,  # size of the extension
+            b"fact",
+            4,
+            self.n_frames,
+            b"data",
+            self.n_frames * sample_size,
+        )
+        self.fp.seek(0)
+        self.fp.write(header)
+
+    def write(self, block):
+        block = np.asarray(block, dtype="<f4")
+        assert block.ndim == 1
+        self.fp.write(block.tobytes())
+        self.n_frames += len(block)
+
+    def close(self):
+        if self.fp.closed:
+            return
+        self._write_header()
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
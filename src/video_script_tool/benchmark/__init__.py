@@ -0,0 +1,5 @@
+"""
+Benchmark suite: generate synthetic projects and measure the throughput of the pipeline stages.
+
+See `video-script-benchmark --help`.
+"""
@@ -0,0 +1,189 @@
+"""
+Time the stages of the pipeline on a synthetic project and store the results as json.
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+from .. import util
+from ..release import __version__
+from .synthetic_project import SyntheticProject
+
+pjoin = os.path.join
+
+# the stages in the order in which they are executed
+STAGES = ["audio_preprocessing", "produce_snippets", "create_video", "text_extraction"]
+
+
+def get_cpu_times():
+    """
+    return the cpu time (user + system) of this process and of all terminated child processes
+    (worker processes and ffmpeg)
+    """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def get_ffmpeg_version():
+    try:
+        res = subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except FileNotFoundError:
+        return None
+    return res.stdout.split("\n")[0]
+
+
+class BenchmarkRunner:
+    def __init__(self, project: SyntheticProject, repetitions=1, jobs=None):
+        self.project = project
+        self.repetitions = repetitions
+        self.jobs = jobs
+
+        # {stage: [{"wall_time": ..., "cpu_time": ...}, ...]}
+        self.measurements = {stage: [] for stage in STAGES}
+
+    def clean_outputs(self):
+        """
+        remove all generated files such that every repetition does the complete work (no cached results)
+        """
+        project_dir = self.project.project_dir
+        for dirname in ("audio_pp", "images_pp", "snippets"):
+            shutil.rmtree(pjoin(project_dir, dirname), ignore_errors=True)
+        for fname in ("filelist.txt", "combined-video.mp4", "combined-video_ppa.mp4"):
+            fpath = pjoin(project_dir, fname)
+            if os.path.isfile(fpath):
+                os.remove(fpath)
+
+    def create_main_manager(self):
+        from .. import core
+
+        args = core.get_default_args(self.project.project_dir, audio_preprocessing=True, jobs=self.jobs)
+        return core.MainManager(args)
+
+    def create_text_extractor(self):
+        from .. import md_processor
+
+        args = argparse.Namespace(
+            project_dir=self.project.project_dir,
+            url="",
+            suffix="",
+            force_reload=False,
+            force_cache=False,
+            force_source=self.project.slides_full_source_fpath,
+        )
+        return md_processor.TextExtractor(args)
+
+    def measure(self, stage, func):
+        print(util.bright(f"--- {stage} ---"))
+        cpu_start = get_cpu_times()
+        start = time.perf_counter()
+        func()
+        wall_time = time.perf_counter() - start
+        cpu_time = get_cpu_times() - cpu_start
+        self.measurements[stage].append({"wall_time": wall_time, "cpu_time": cpu_time})
+
+    def run(self):
+        for _ in range(self.repetitions):
+            self.clean_outputs()
+            mm = self.create_main_manager()
+            mm.load_data()
+            self.measure("audio_preprocessing", mm.do_audio_preprocessing)
+            self.measure("produce_snippets", mm.produce_snippets)
+            self.measure("create_video", mm.create_video)
+
+            te = self.create_text_extractor()
+            self.measure("text_extraction", te.perform_text_extraction)
+
+    def get_results(self) -> dict:
+        params = self.project.get_params()
+        total_audio_duration = params["n_files"] * params["audio_duration"]
+
+        stages = {}
+        for stage, measurements in self.measurements.items():
+            wall_times = [m["wall_time"] for m in measurements]
+            median_wall_time = statistics.median(wall_times)
+            stages[stage] = {
+                "measurements": measurements,
+                "median_wall_time": median_wall_time,
+                "median_cpu_time": statistics.median(m["cpu_time"] for m in measurements),
+                "min_wall_time": min(wall_times),
+                # seconds of audio per second of wall time
+                "realtime_factor": total_audio_duration / median_wall_time if median_wall_time > 0 else None,
+            }
+
+        return {
+            "version": __version__,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "system": {
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "cpu_count": os.cpu_count(),
+                "ffmpeg": get_ffmpeg_version(),
+            },
+            "params": {**params, "repetitions": self.repetitions, "jobs": self.jobs},
+            "stages": stages,
+        }
+
+
+def print_results(results, reference=None):
+    """
+    print the median wall times (and the ratio to the reference results, if given)
+    """
+    if reference is not None:
+        print(f"reference: version {reference['version']} ({reference['timestamp']})")
+        if reference["params"] != results["params"]:
+            print(util.yellow("parameters of the reference differ, the comparison might be meaningless"))
+
+    for stage, data in results["stages"].items():
+        line = f"{stage:>20}: {data['median_wall_time']:8.2f} s wall, {data['median_cpu_time']:8.2f} s cpu"
+        ref_data = reference["stages"].get(stage) if reference is not None else None
+        if ref_data:
+            ratio = data["median_wall_time"] / ref_data["median_wall_time"]
+            txt = f"  ({ratio:.2f} x reference)"
+            line += util.bred(txt) if ratio > 1.1 else txt
+        print(line)
+
+
+def main(args):
+    width, height = (int(value) for value in args.resolution.lower().split("x"))
+
+    project_dir = args.project_dir
+    if project_dir is None:
+        project_dir = tempfile.mkdtemp(prefix="video-script-benchmark-")
+
+    project = SyntheticProject(
+        project_dir,
+        n_slides=args.slides,
+        n_fragments=args.fragments,
+        resolution=(width, height),
+        audio_duration=args.audio_duration,
+    )
+    print(f"creating synthetic project: {project_dir}")
+    project.create()
+
+    runner = BenchmarkRunner(project, repetitions=args.repetitions, jobs=args.jobs)
+    runner.run()
+    results = runner.get_results()
+
+    reference = None
+    if args.compare:
+        with open(args.compare, "r") as fp:
+            reference = json.load(fp)
+    print_results(results, reference)
+
+    output_fpath = args.output or f"benchmark-{__version__}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output_fpath, "w") as fp:
+        json.dump(results, fp, indent=2)
+        fp.write("\n")
+    print(f"File written: {output_fpath}")
+
+    if args.project_dir is None and not args.keep:
+        shutil.rmtree(project_dir)
+    else:
+        print(f"project kept: {project_dir}")
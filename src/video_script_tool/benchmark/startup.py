@@ -0,0 +1,66 @@
+"""
+Measure the startup time of the command line entry points (`<entry point> --help`).
+"""
+
+import sys
+import time
+import subprocess
+
+from .. import util
+
+# maximum time (in seconds) for `--help` of every entry point (includes the start of the interpreter)
+STARTUP_TIME_BUDGET = 0.5
+
+# names of the functions in cli.py (see [project.scripts] in pyproject.toml)
+ENTRY_POINTS = ["main", "video_script", "build", "capture_slides", "record_audio_gui", "extract_texts", "benchmark"]
+
+# these must not be imported just for parsing the command line
+HEAVY_MODULES = [
+    "numpy", "scipy", "noisereduce", "pedalboard", "pyaudio", "ipydex", "requests", "PyQt5", "selenium", "PIL"
+]
+
+SCRIPT = """
+import sys
+sys.argv = ["{name}", "--help"]
+from video_script_tool import cli
+try:
+    cli.{name}()
+except SystemExit:
+    pass
+heavy = [name for name in {heavy_modules!r} if name in sys.modules]
+sys.stderr.write(",".join(heavy))
+"""
+
+
+def measure_startup_time(name, repetitions=3):
+    """
+    return (best startup time, list of heavy modules which were imported) for one entry point
+    """
+    script = SCRIPT.format(name=name, heavy_modules=HEAVY_MODULES)
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        res = subprocess.run(
+            [sys.executable, "-c", script], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        times.append(time.perf_counter() - start)
+        if res.returncode != 0:
+            msg = f"`{name} --help` failed:\n{res.stderr}"
+            raise RuntimeError(msg)
+    imported_modules = [module for module in res.stderr.strip().split(",") if module]
+    return min(times), imported_modules
+
+
+def check_startup_times(budget=STARTUP_TIME_BUDGET) -> bool:
+    """
+    print the startup time of all entry points; return False if one exceeds the budget or imports heavy modules
+    """
+    success = True
+    for name in ENTRY_POINTS:
+        startup_time, imported_modules = measure_startup_time(name)
+        line = f"{name:>20}: {startup_time:.3f} s"
+        if startup_time > budget or imported_modules:
+            success = False
+            line = util.bred(f"{line} (budget: {budget} s; heavy imports: {imported_modules})")
+        print(line)
+    return success
@@ -0,0 +1,146 @@
+"""
+Generate synthetic project directories (images, recordings and markdown sources) for benchmarking.
+"""
+
+import os
+import zlib
+import struct
+
+import numpy as np
+
+from .. import audio_io
+
+pjoin = os.path.join
+
+
+class SyntheticProject:
+    """
+    Project directory with `n_slides * n_fragments` image/audio pairs and matching markdown files.
+
+    The layout is the same as that produced by video-script-cs, video-script-et and video-script-rag
+    (see README): `images/slide_001_fragment_001.png`, `audio/slide_001_fragment_001.wav`, `all_texts.md`,
+    `slides_full_source.md`.
+    """
+
+    def __init__(
+        self, project_dir, n_slides=10, n_fragments=2, resolution=(1920, 1080), audio_duration=5.0, rate=44100,
+        seed=0,
+    ):
+        self.project_dir = project_dir
+        self.n_slides = n_slides
+        self.n_fragments = n_fragments
+        self.resolution = resolution
+        self.audio_duration = audio_duration
+        self.rate = rate
+        self.rng = np.random.default_rng(seed)
+
+        self.image_dir = pjoin(self.project_dir, "images")
+        self.audio_dir = pjoin(self.project_dir, "audio")
+        self.slides_full_source_fpath = pjoin(self.project_dir, "slides_full_source.md")
+        self.all_texts_fpath = pjoin(self.project_dir, "all_texts.md")
+
+    def get_params(self) -> dict:
+        width, height = self.resolution
+        return {
+            "n_slides": self.n_slides,
+            "n_fragments": self.n_fragments,
+            "n_files": self.n_slides * self.n_fragments,
+            "resolution": f"{width}x{height}",
+            "audio_duration": self.audio_duration,
+            "rate": self.rate,
+        }
+
+    def get_basenames(self):
+        return [
+            f"slide_{slide:03d}_fragment_{fragment:03d}"
+            for slide in range(1, self.n_slides + 1)
+            for fragment in range(1, self.n_fragments + 1)
+        ]
+
+    def create(self):
+        os.makedirs(self.image_dir, exist_ok=True)
+        os.makedirs(self.audio_dir, exist_ok=True)
+
+        for k, basename in enumerate(self.get_basenames()):
+            write_png(pjoin(self.image_dir, f"{basename}.png"), self.create_image(k))
+            audio_io.write_wav(pjoin(self.audio_dir, f"{basename}.wav"), self.rate, self.create_recording())
+
+        self.write_markdown_files()
+
+    def create_image(self, k):
+        """
+        Return an RGB image (uint8 array) which resembles a slide: light background, some dark "text lines"
+        and a colored box whose position depends on `k` (such that all images differ).
+        """
+        width, height = self.resolution
+        img = np.full((height, width, 3), 245, dtype=np.uint8)
+
+        line_height = max(1, height // 40)
+        for row in range(height // 5, height - height // 10, 3 * line_height):
+            line_length = self.rng.integers(width // 4, width - width // 5)
+            img[row:row + line_height, width // 10:width // 10 + line_length] = 30
+
+        box_size = max(1, min(width, height) // 6)
+        x0 = (k * box_size) % max(1, width - box_size)
+        img[:box_size, x0:x0 + box_size] = (40, 90, 200)
+        return img
+
+    def create_recording(self):
+        """
+        Return int16 mono samples which resemble a voice recording: background noise plus syllable-like bursts
+        of harmonic tones (16 bit like the recordings of video-script-rag).
+        """
+        n = int(self.audio_duration * self.rate)
+        t = np.arange(n) / self.rate
+
+        noise = self.rng.normal(scale=0.01, size=n)
+        f0 = self.rng.uniform(100, 220)
+        voice = sum(np.sin(2 * np.pi * f0 * h * t) / h for h in range(1, 6))
+
+        # syllables: ~4 per second with short pauses in between
+        envelope = np.clip(np.sin(2 * np.pi * 4 * t + self.rng.uniform(0, 2 * np.pi)), 0, None) ** 2
+        signal = 0.2 * voice * envelope + noise
+        return (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+
+    def write_markdown_files(self):
+        slide_sources = ["---\ntitle: synthetic benchmark\nslideOptions:\n  transition: none\n---"]
+        texts = []
+        for slide in range(1, self.n_slides + 1):
+            lines = [f"## Slide {slide}", ""]
+            for fragment in range(1, self.n_fragments + 1):
+                text = f"Voiceover text of slide {slide}, fragment {fragment}. " * 3
+                texts.append(text.strip())
+                lines.append(f"- item {fragment} <!-- .element: class=\"fragment\" -->")
+                lines.append(f"<!--f{fragment} {text.strip()} /-->")
+            slide_sources.append("\n".join(lines))
+
+        with open(self.slides_full_source_fpath, "w", encoding="utf8") as fp:
+            fp.write("\n\n---\n\n".join(slide_sources))
+            fp.write("\n")
+
+        with open(self.all_texts_fpath, "w", encoding="utf8") as fp:
+            fp.write("\n\n---\n\n".join(texts))
+            fp.write("\n")
+
+
+def write_png(fpath, img):
+    """
+    Write an RGB uint8 array as png file (only zlib is needed, no imaging library).
+    """
+    height, width, _ = img.shape
+
+    def chunk(chunk_type, data):
+        return (
+            struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+        )
+
+    # every row starts with the filter type (0: no filter)
+    raw = np.empty((height, 1 + 3 * width), dtype=np.uint8)
+    raw[:, 0] = 0
+    raw[:, 1:] = img.reshape(height, 3 * width)
+
+    with open(fpath, "wb") as fp:
+        fp.write(b"\x89PNG\r\n\x1a\n")
+        fp.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        fp.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        fp.write(chunk(b"IEND", b""))
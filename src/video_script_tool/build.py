@@ -0,0 +1,337 @@
+"""
+Make-style orchestration of all tools (`video-script build <project-dir>`).
+
+The stages (capture, extraction, preprocessing, rendering) form a DAG over the files of the project. Every stage
+records a hash of its inputs in `build_state.json`; a stage runs only if this hash changed (or one of its outputs
+is missing). Stages whose dependencies are finished run in parallel.
+"""
+
+import os
+import glob
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from . import util
+
+pjoin = os.path.join
+
+
+class Stage:
+    """
+    One node of the build graph.
+
+    :param run:         callable which does the work
+    :param get_inputs:  callable which returns the input files (their content is hashed)
+    :param get_outputs: callable which returns the files which must exist after the stage ran
+    :param get_params:  callable which returns further (json serializable) parameters that influence the result
+    :param deps:        names of the stages which must be finished before this stage is considered
+    """
+
+    def __init__(self, name, run, get_inputs, get_outputs, get_params=None, deps=()):
+        self.name = name
+        self.run = run
+        self.get_inputs = get_inputs
+        self.get_outputs = get_outputs
+        self.get_params = get_params or (lambda: None)
+        self.deps = list(deps)
+
+    def get_input_hash(self):
+        # the inputs are evaluated only now (i.e. after the dependencies produced them)
+        return util.get_content_hash(*self.get_inputs(), extra=self.get_params())
+
+    def outputs_exist(self):
+        outputs = self.get_outputs()
+        return len(outputs) > 0 and all(os.path.exists(fpath) for fpath in outputs)
+
+
+class BuildState:
+    """
+    Json file which maps stage names to the hash of their inputs at the last successful run.
+    """
+
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.data = {}
+        if os.path.isfile(self.fpath):
+            with open(self.fpath, "r") as fp:
+                self.data = json.load(fp)
+
+    def save(self):
+        with open(self.fpath, "w") as fp:
+            json.dump(self.data, fp, indent=2, sort_keys=True)
+            fp.write("\n")
+
+
+class Pipeline:
+    def __init__(self, stages, state_fpath, forced_stages=(), dry_run=False):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state = BuildState(state_fpath)
+        self.forced_stages = set(forced_stages)
+        self.dry_run = dry_run
+
+        for stage in stages:
+            for dep in stage.deps:
+                assert dep in self.stages, f"unknown dependency of stage {stage.name}: {dep}"
+
+    def is_up_to_date(self, stage, input_hash):
+        if stage.name in self.forced_stages:
+            return False
+        return self.state.data.get(stage.name) == input_hash and stage.outputs_exist()
+
+    def process_stage(self, stage):
+        """
+        run the stage if necessary; return True if it ran
+        """
+        input_hash = stage.get_input_hash()
+        if self.is_up_to_date(stage, input_hash):
+            print(util.bgreen(f"stage up to date: {stage.name}"))
+            return False
+
+        if self.dry_run:
+            print(util.yellow(f"stage would run: {stage.name}"))
+            return True
+
+        print(util.bright(f"running stage: {stage.name}"))
+        stage.run()
+        self.state.data[stage.name] = input_hash
+        return True
+
+    def run(self):
+        done = set()
+        failed = set()
+        pending = dict(self.stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.stages))) as executor:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if any(dep in failed for dep in stage.deps):
+                        print(util.bred(f"stage skipped (failed dependency): {name}"))
+                        failed.add(name)
+                        del pending[name]
+                    elif all(dep in done for dep in stage.deps):
+                        running[executor.submit(self.process_stage, stage)] = name
+                        del pending[name]
+
+                if not running:
+                    if not pending:
+                        # the remaining stages were skipped because of failed dependencies
+                        break
+                    # only possible if the graph has a cycle
+                    msg = f"unresolvable dependencies: {sorted(pending)}"
+                    raise ValueError(msg)
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as ex:
+                        print(util.bred(f"stage failed: {name} ({type(ex).__name__}: {ex})"))
+                        failed.add(name)
+                    else:
+                        done.add(name)
+
+                # keep the information about the successful stages (also if a later stage fails)
+                if not self.dry_run:
+                    self.state.save()
+
+        if failed:
+            msg = f"build failed, affected stages: {sorted(failed)}"
+            raise RuntimeError(msg)
+
+
+class ProjectBuilder:
+    """
+    Create the stages for one project directory (see README for the layout).
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.project_dir = args.project_dir
+        self.image_dir = pjoin(self.project_dir, "images")
+        self.audio_dir = pjoin(self.project_dir, "audio")
+        self.audio_pp_dir = pjoin(self.project_dir, "audio_pp")
+        self.slides_full_source_fpath = pjoin(self.project_dir, "slides_full_source.md")
+
+    def get_image_files(self):
+        return sorted(glob.glob(pjoin(self.image_dir, "*.png")))
+
+    def get_audio_files(self, preprocessed=False):
+        audio_dir = self.audio_pp_dir if preprocessed else self.audio_dir
+        return sorted(glob.glob(pjoin(audio_dir, "*.wav")))
+
+    def get_noise_files(self):
+        return sorted(glob.glob(pjoin(self.audio_dir, "noise", "noise.wav")))
+
+    def create_main_manager(self, audio_preprocessing=False):
+        from . import core
+
+        args = core.get_default_args(
+            self.project_dir,
+            audio_preprocessing=audio_preprocessing,
+            jobs=self.args.jobs,
+            render_mode=self.args.render_mode,
+            noise_profile=self.args.noise_profile,
+            loudness_normalization=self.args.loudness_normalization,
+            loudness_target=self.args.loudness_target,
+        )
+        return core.MainManager(args)
+
+    # stage functions
+
+    def fetch_md_source(self):
+        """
+        download the markdown source (if an url is given) such that the hashes of the stages which depend on it
+        (capture, extraction) reflect its current content
+        """
+        if not self.args.md_source_url:
+            return
+        from . import md_processor
+
+        args = argparse.Namespace(
+            project_dir=self.project_dir,
+            url=self.args.md_source_url,
+            suffix="",
+            force_reload=True,
+            force_cache=False,
+            force_source=None,
+        )
+        md_processor.TextExtractor(args).download_source()
+
+    def get_md_source_files(self):
+        return [fpath for fpath in [self.slides_full_source_fpath] if os.path.isfile(fpath)]
+
+    def run_capture(self):
+        from . import capture_slides
+
+        # with a markdown source only the changed slides are captured again (unless the stage is forced)
+        incremental = bool(self.get_md_source_files()) and "capture" not in self.args.force
+        args = argparse.Namespace(
+            project_dir=self.project_dir,
+            url=self.args.presentation_url,
+            first_slide_number=self.args.first_slide_number,
+            suffix="",
+            no_transitions=False,
+            browsers=1,
+            crop=None,
+            optimize_png=False,
+            incremental=incremental,
+            md_source=self.slides_full_source_fpath if incremental else None,
+        )
+        capture_slides.main(args)
+
+    def run_extraction(self):
+        from . import md_processor
+
+        # the source was already downloaded (see fetch_md_source)
+        args = argparse.Namespace(
+            project_dir=self.project_dir,
+            url=self.args.md_source_url,
+            suffix="",
+            force_reload=False,
+            force_cache=False,
+            force_source=self.slides_full_source_fpath,
+        )
+        md_processor.extract_text(args)
+
+    def run_preprocessing(self):
+        mm = self.create_main_manager(audio_preprocessing=True)
+        mm.do_audio_preprocessing()
+        if self.args.loudness_normalization:
+            mm.do_loudness_normalization()
+
+    def run_rendering(self):
+        mm = self.create_main_manager()
+        mm.use_preprocessed_audio = self.args.audio_preprocessing
+        if self.args.render_mode == "single-pass":
+            mm.render_single_pass()
+        else:
+            mm.produce_snippets()
+            mm.create_video()
+
+    def get_preprocessing_params(self):
+        from . import core
+
+        params = core.get_preprocessing_params()
+        params["noise_profile"] = self.args.noise_profile
+        params["loudness_normalization"] = self.args.loudness_normalization
+        params["loudness_target"] = self.args.loudness_target
+        return params
+
+    def get_output_fpath(self):
+        ppa_part = "_ppa" if self.args.audio_preprocessing else ""
+        return pjoin(self.project_dir, f"combined-video{ppa_part}.mp4")
+
+    def create_stages(self):
+        stages = []
+        capture_deps = ["capture"] if self.args.presentation_url else []
+        render_deps = capture_deps[:]
+
+        if self.args.presentation_url:
+            stages.append(
+                Stage(
+                    "capture",
+                    self.run_capture,
+                    # without a markdown source only the url is known (use `--force capture` after changes)
+                    get_inputs=self.get_md_source_files,
+                    get_outputs=self.get_image_files,
+                    get_params=lambda: [self.args.presentation_url, self.args.first_slide_number],
+                )
+            )
+
+        if self.args.md_source_url or os.path.isfile(self.slides_full_source_fpath):
+            stages.append(
+                Stage(
+                    "extraction",
+                    self.run_extraction,
+                    # only the names of the images matter (number of fragments per slide)
+                    get_inputs=self.get_md_source_files,
+                    get_outputs=lambda: [pjoin(self.project_dir, "all_texts.md")],
+                    get_params=lambda: [os.path.basename(fpath) for fpath in self.get_image_files()],
+                    deps=capture_deps,
+                )
+            )
+
+        if self.args.audio_preprocessing:
+            stages.append(
+                Stage(
+                    "preprocessing",
+                    self.run_preprocessing,
+                    get_inputs=lambda: self.get_audio_files() + self.get_noise_files(),
+                    get_outputs=lambda: [
+                        pjoin(self.audio_pp_dir, os.path.basename(fpath)) for fpath in self.get_audio_files()
+                    ],
+                    get_params=self.get_preprocessing_params,
+                )
+            )
+            render_deps.append("preprocessing")
+
+        stages.append(
+            Stage(
+                "rendering",
+                self.run_rendering,
+                get_inputs=lambda: self.get_image_files() + self.get_audio_files(self.args.audio_preprocessing),
+                get_outputs=lambda: [self.get_output_fpath()],
+                get_params=lambda: {"render_mode": self.args.render_mode},
+                deps=render_deps,
+            )
+        )
+        return stages
+
+
+def main(args):
+    builder = ProjectBuilder(args)
+    builder.fetch_md_source()
+    stages = builder.create_stages()
+
+    unknown_stages = set(args.force) - {stage.name for stage in stages}
+    if unknown_stages:
+        msg = f"--force: stage(s) not part of this build: {sorted(unknown_stages)}"
+        raise ValueError(msg)
+
+    pipeline = Pipeline(
+        stages, pjoin(args.project_dir, "build_state.json"), forced_stages=args.force, dry_run=args.dry_run
+    )
+    pipeline.run()
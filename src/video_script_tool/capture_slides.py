@@ -1,19 +1,196 @@
-from PIL import Image
-import time
 import io
 import os
+import glob
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.keys import Keys
 
-from ipydex import IPS
+from . import util
 
 pjoin = os.path.join
 
+# maximum time (in seconds) to wait for the reaction of the presentation to one step
+STEP_TIMEOUT = 10
+
+# javascript helper: call `callback` after all (finite) css transitions/animations of the page have finished
+# (they are reported by the web animations api) and the final state was painted
+WAIT_FOR_ANIMATIONS_JS = """
+function waitForAnimations(callback) {
+    function check() {
+        const running = document.getAnimations().filter(
+            a => a.playState === "running" && isFinite(a.effect.getTiming().iterations)
+        );
+        if (running.length === 0) {
+            requestAnimationFrame(() => requestAnimationFrame(callback));
+        } else {
+            Promise.all(running.map(a => a.finished.catch(() => null))).then(check);
+        }
+    }
+    requestAnimationFrame(check);
+}
+"""
+
+# wait until reveal.js is ready and the page does not move anymore
+WAIT_FOR_READY_SCRIPT = WAIT_FOR_ANIMATIONS_JS + """
+const done = arguments[arguments.length - 1];
+const timer = setTimeout(() => done(false), arguments[0]);
+function finish() {
+    waitForAnimations(() => {clearTimeout(timer); done(true);});
+}
+if (Reveal.isReady()) {
+    finish();
+} else {
+    Reveal.addEventListener("ready", finish);
+}
+"""
+
+# go one step forward (like the right arrow key), wait for the resulting event and the end of the transition and
+# return the navigation state afterwards (everything the capture loop needs in one round-trip)
+STEP_SCRIPT = WAIT_FOR_ANIMATIONS_JS + """
+const done = arguments[arguments.length - 1];
+const events = ["slidechanged", "fragmentshown", "fragmenthidden"];
+const before = Reveal.getIndices();
+let finished = false;
+function finish(result) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    clearTimeout(timer);
+    events.forEach(name => Reveal.removeEventListener(name, onEvent));
+    const after = Reveal.getIndices();
+    const new_slide = after.h !== before.h || after.v !== before.v;
+    done({
+        indices: [after.h, after.v, after.f === undefined ? -1 : after.f],
+        new_slide: new_slide,
+        moved: new_slide || after.f !== before.f,
+        timed_out: !result,
+    });
+}
+function onEvent() {
+    waitForAnimations(() => finish(true));
+}
+const timer = setTimeout(() => finish(false), arguments[0]);
+if (!Reveal.availableFragments().next && !Reveal.availableRoutes().right) {
+    // end of the deck (in this direction): no event will follow
+    finish(true);
+} else {
+    events.forEach(name => Reveal.addEventListener(name, onEvent));
+    Reveal.right();
+}
+"""
+
+# jump directly to slide (h, v) with all fragments up to index f visible (f = -1: no fragment visible)
+GOTO_SCRIPT = WAIT_FOR_ANIMATIONS_JS + """
+const done = arguments[arguments.length - 1];
+const [timeout, h, v, f] = arguments;
+const events = ["slidechanged", "fragmentshown", "fragmenthidden"];
+let finished = false;
+function finish(result) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    clearTimeout(timer);
+    events.forEach(name => Reveal.removeEventListener(name, onEvent));
+    done(result);
+}
+function onEvent() {
+    waitForAnimations(() => finish(true));
+}
+const timer = setTimeout(() => finish(false), timeout);
+const indices = Reveal.getIndices();
+if (indices.h === h && indices.v === v && (indices.f === undefined ? -1 : indices.f) === f) {
+    onEvent();
+} else {
+    events.forEach(name => Reveal.addEventListener(name, onEvent));
+    Reveal.slide(h, v, f);
+}
+"""
+
+# return [[h, v, [fragment indices]], ...] for all slides which are visited by the right arrow key
+# (i.e. the first slide of every vertical stack)
+ENUMERATE_SCRIPT = """
+return Reveal.getHorizontalSlides().map((_, h) => {
+    const slide = Reveal.getSlide(h, 0);
+    const indices = new Set();
+    let unsorted = 0;
+    slide.querySelectorAll(".fragment").forEach(el => {
+        if (el.closest("section") !== slide) {
+            return;
+        }
+        if (el.hasAttribute("data-fragment-index")) {
+            indices.add(parseInt(el.getAttribute("data-fragment-index")));
+        } else {
+            unsorted += 1;
+        }
+    });
+    const sorted_indices = [...indices].sort((a, b) => a - b);
+    const n = sorted_indices.length;
+    for (let i = 0; i < unsorted; i++) {
+        sorted_indices.push(n + i);
+    }
+    return [h, 0, sorted_indices];
+});
+"""
+
+DISABLE_TRANSITIONS_SCRIPT = """
+Reveal.configure({transition: "none", backgroundTransition: "none"});
+const style = document.createElement("style");
+style.textContent = ".reveal .slides section, .reveal .fragment {transition: none !important;}";
+document.head.appendChild(style);
+"""
+
+
+class ImageWriter:
+    """
+    Write the screenshots in background threads (the browser continues with the next step meanwhile).
+
+    Without crop and optimization the png data of the browser is written as it is (no decoding/encoding).
+
+    :param crop:        None or (left, top, right, bottom) in pixels
+    :param optimize:    compress the png files as much as possible (slower)
+    """
+
+    def __init__(self, crop=None, optimize=False, max_workers=4):
+        if crop is not None and len(crop) != 4:
+            msg = f"crop box must consist of 4 values (left, top, right, bottom), got: {crop}"
+            raise ValueError(msg)
+        self.crop = crop
+        self.optimize = optimize
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = []
+
+    def submit(self, fpath, png):
+        self.futures.append(self.executor.submit(self.write, fpath, png))
+
+    def write(self, fpath, png):
+        if self.crop is None and not self.optimize:
+            with open(fpath, "wb") as fp:
+                fp.write(png)
+        else:
+            from PIL import Image
+
+            img = Image.open(io.BytesIO(png))
+            if self.crop is not None:
+                img = img.crop(self.crop)
+            img.save(fpath, optimize=self.optimize)
+        print(f"Screenshot written: {fpath}")
+
+    def close(self):
+        """
+        wait until all images are written; re-raise the first error
+        """
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
+
 
 class SlideCaptureManager:
     def __init__(self, args):
@@ -21,10 +198,16 @@ class SlideCaptureManager:
         self.url = args.url
         self.suffix = args.suffix
         self.first_slide_number = args.first_slide_number
-        self.image_dir = f"images{self.suffix}"
+        self.no_transitions = args.no_transitions
+        self.n_browsers = args.browsers
+        self.image_writer = ImageWriter(crop=args.crop, optimize=args.optimize_png)
+        self.incremental = args.incremental
+        self.md_source = args.md_source
+        self.image_dir = pjoin(self.project_dir, f"images{self.suffix}")
+        self.slide_hashes_fpath = pjoin(self.image_dir, "slide_hashes.json")
         os.makedirs(self.image_dir, exist_ok=True)
 
-    def capture_slides(self):
+    def create_driver(self):
         # Set up Chrome options for headless browsing
         chrome_options = Options()
         chrome_options.add_argument("--disable-search-engine-choice-screen")
@@ -39,7 +222,9 @@ class SlideCaptureManager:
             chrome_options.add_argument("--window-size=1000,600")
 
         # Initialize the WebDriver
-        driver = webdriver.Chrome(options=chrome_options)
+        return webdriver.Chrome(options=chrome_options)
+
+    def open_presentation(self, driver):
         driver.get(self.url)
 
         # Wait for the presentation to load
@@ -47,94 +232,227 @@ class SlideCaptureManager:
             EC.presence_of_element_located((By.CLASS_NAME, "reveal"))
         )
 
+        # the async scripts report a timeout by themselves (a bit earlier than selenium)
+        driver.set_script_timeout(STEP_TIMEOUT + 5)
+
         # Enter fullscreen mode
         driver.find_element(By.CLASS_NAME, "reveal").click()
-        time.sleep(1)  # Wait for transition
+        self.wait_for(driver, WAIT_FOR_READY_SCRIPT, "presentation ready")
 
-        slide_count = self.first_slide_number
-        fragment_count = 1
-        last_slide_flag = False
-        image_count = 0
+        if self.no_transitions:
+            driver.execute_script(DISABLE_TRANSITIONS_SCRIPT)
+
+    def save_screenshot(self, driver, slide_count, fragment_count):
+        fpath = pjoin(self.image_dir, f"slide_{slide_count:03d}_fragment_{fragment_count:03d}.png")
+        self.image_writer.submit(fpath, driver.get_screenshot_as_png())
+
+    def capture_slides(self):
+        try:
+            if self.incremental:
+                self.capture_slides_incremental()
+            elif self.n_browsers > 1:
+                self.capture_slides_sharded()
+            else:
+                self.capture_slides_linear()
+        finally:
+            self.image_writer.close()
 
-        last_slide_number = "1"
+    def capture_slides_linear(self):
+        driver = self.create_driver()
+        self.open_presentation(driver)
 
-        old_progress_width = -100.0
+        slide_count = self.first_slide_number
+        fragment_count = 1
 
         while True:
             # Capture the current slide
-            image_count += 1
-            png = driver.get_screenshot_as_png()
-            img = Image.open(io.BytesIO(png))
-            fpath = pjoin(self.image_dir, f"slide_{slide_count:03d}_fragment_{fragment_count:03d}.png")
-            img.save(fpath)
-            print(f"Screenshot written: {fpath}")
-            if last_slide_flag:
+            self.save_screenshot(driver, slide_count, fragment_count)
+
+            # go to the next fragment or slide (like the right arrow key) and wait until the page is ready
+            state = driver.execute_async_script(STEP_SCRIPT, STEP_TIMEOUT * 1000)
+            if state["timed_out"]:
+                print(util.yellow(f"no reaction of the presentation after {STEP_TIMEOUT} s: next fragment or slide"))
+
+            if not state["moved"]:
+                # reveal did not move anymore → we've reached the end of the presentation
+                # (also if the last slide has a sub-slide, which is not visited by the right arrow key)
                 break
 
-            # Check for fragments (does not work reliably)
-            fragments = driver.find_elements(By.CLASS_NAME, "fragment")
-            visible_fragments = [f for f in fragments if "visible" in f.get_attribute("class")]
+            if state["new_slide"]:
+                fragment_count = 1
+                slide_count += 1
+            else:
+                # More fragments to reveal
+                fragment_count += 1
 
-            driver.find_element(By.TAG_NAME, "body").send_keys(Keys.RIGHT)
-            time.sleep(0.8)  # Wait for transition
-            new_slide_number = driver.find_elements(By.CLASS_NAME, "slide-number")[0].text
+        driver.quit()
 
-            progress_element = driver.find_elements(By.CLASS_NAME, "progress")[0]
-            progress_span = progress_element.find_element(By.TAG_NAME, "span")
-            progress_width_str = progress_span.value_of_css_property("width")
-            assert progress_width_str.endswith("px")
-            progress_width = float(progress_width_str[:-2])
+    def enumerate_steps(self):
+        """
+        return a list of (slide_count, fragment_count, (h, v, f)), i.e. the file name numbers and reveal indices of
+        all states which the linear capture visits
+        """
+        driver = self.create_driver()
+        try:
+            self.open_presentation(driver)
+            slides = driver.execute_script(ENUMERATE_SCRIPT)
+        finally:
+            driver.quit()
 
-            width_diff = progress_width - old_progress_width
-            print(f"{old_progress_width=} → {progress_width=} → {width_diff=}")
+        steps = []
+        for h, v, fragment_indices in slides:
+            slide_count = self.first_slide_number + h
+            for fragment_count, f in enumerate([-1] + fragment_indices, start=1):
+                steps.append((slide_count, fragment_count, (h, v, f)))
+        return steps
 
-            if new_slide_number == last_slide_number:
-                # More fragments to reveal
-                fragment_count += 1
-            else:
-                fragment_count = 1
-                slide_count += 1
+    def capture_slides_sharded(self):
+        self.capture_steps(self.enumerate_steps())
 
-            last_slide_number = new_slide_number
+    def capture_steps(self, steps):
+        """
+        split the steps into contiguous parts which are captured by `self.n_browsers` browsers in parallel
+        """
+        if not steps:
+            print(util.bgreen("all slides up to date"))
+            return
 
-            # Check if we've reached the end of the presentation
-            # There are 2 different situations:
-            # - last slide has no sub-slide
-            # - last slide has a sub-slide
+        n_shards = min(self.n_browsers, len(steps))
+        print(util.bright(f"capturing {len(steps)} images with {n_shards} browsers"))
 
-            if "enabled" in driver.find_element(By.CLASS_NAME, "navigate-down").get_attribute("class"):
-                has_subslide = True
-            else:
-                has_subslide = False
+        shard_size = -(-len(steps) // n_shards)
+        shards = [steps[i:i + shard_size] for i in range(0, len(steps), shard_size)]
+        with ThreadPoolExecutor(max_workers=n_shards) as executor:
+            # list(...) re-raises the first exception of a shard
+            list(executor.map(self.capture_shard, shards))
 
-            if "enabled" in driver.find_element(By.CLASS_NAME, "navigate-right").get_attribute("class"):
-                has_next_slide = True
-            else:
-                has_next_slide = False
-
-            if not has_subslide:
-                if not has_next_slide:
-                    # break the loop after saving the last screenshot
-                    last_slide_flag = True
-                else:
-                    # there is a ">" symbol → at least one slide/fragment will follow
-                    pass
+    def load_slides_full_source(self):
+        from . import md_processor
+
+        # same source handling as video-script-et (the downloaded source is cached in the project dir)
+        is_url = self.md_source is not None and self.md_source.startswith(("http://", "https://"))
+        if self.md_source is None:
+            force_source = pjoin(self.project_dir, f"slides_full_source{self.suffix}.md")
+        elif is_url:
+            force_source = None
+        else:
+            force_source = self.md_source
+
+        md_args = argparse.Namespace(
+            project_dir=self.project_dir,
+            url=self.md_source if is_url else None,
+            suffix=self.suffix,
+            force_reload=False,
+            force_cache=False,
+            force_source=force_source,
+        )
+        te = md_processor.TextExtractor(md_args)
+        te.download_source()
+        return te.slides_full_source
+
+    def get_slide_image_files(self, slide_count):
+        return sorted(glob.glob(pjoin(self.image_dir, f"slide_{slide_count:03d}_fragment_*.png")))
+
+    def load_slide_hashes(self) -> dict:
+        """
+        return the content of slide_hashes.json: {presentation url: {"slide_001": hash, ...}}
+
+        Several presentations (parts of a lecture, see --first-slide-number) can share one image directory; every
+        presentation owns the slides which are listed under its url (hash None: owned, but captured without a
+        matching markdown source).
+        """
+        if not os.path.isfile(self.slide_hashes_fpath):
+            return {}
+        with open(self.slide_hashes_fpath, "r") as fp:
+            return json.load(fp)
+
+    def save_slide_hashes(self, data):
+        with open(self.slide_hashes_fpath, "w") as fp:
+            json.dump(data, fp, indent=2, sort_keys=True)
+            fp.write("\n")
+
+    def capture_slides_incremental(self):
+        """
+        capture only the slides whose markdown source changed since the last capture (hashes in slide_hashes.json)
+        """
+        from . import md_processor
+
+        slide_sources = md_processor.split_slide_sources(self.load_slides_full_source())
+        all_slide_hashes = self.load_slide_hashes()
+        old_hashes = all_slide_hashes.get(self.url, {})
+
+        steps = self.enumerate_steps()
+        slide_counts = sorted({slide_count for slide_count, _, _ in steps})
+        slide_keys = {slide_count: f"slide_{slide_count:03d}" for slide_count in slide_counts}
+
+        # the images also depend on the post processing options
+        extra = [self.image_writer.crop, self.image_writer.optimize]
+        hashes = {}
+        if len(slide_sources) == len(slide_counts):
+            for slide_count, slide_src in zip(slide_counts, slide_sources):
+                hashes[slide_count] = util.get_content_hash(extra=[slide_src] + extra)
+        else:
+            print(util.yellow(
+                f"the presentation has {len(slide_counts)} slides but the markdown source has {len(slide_sources)}"
+                " → capturing all slides"
+            ))
+
+        # slides of other presentations with the same numbers are taken over (overlapping --first-slide-number)
+        for url, other_hashes in all_slide_hashes.items():
+            if url == self.url:
+                continue
+            for slide_count, key in slide_keys.items():
+                if key in other_hashes:
+                    print(util.yellow(f"slide {slide_count} was captured from another presentation: {url}"))
+                    del other_hashes[key]
+
+        changed_slides = [
+            slide_count for slide_count in slide_counts
+            if slide_count not in hashes
+            or old_hashes.get(slide_keys[slide_count]) != hashes[slide_count]
+            or not self.get_slide_image_files(slide_count)
+        ]
+
+        # remove the old images of the changed slides (their number of fragments might have changed) and of the
+        # slides of this presentation which do not exist anymore (images of other presentations are kept)
+        obsolete_slides = changed_slides + [
+            int(key.split("_")[1]) for key in old_hashes if key not in slide_keys.values()
+        ]
+        for slide_count in obsolete_slides:
+            for fpath in self.get_slide_image_files(slide_count):
+                os.remove(fpath)
+
+        print(util.bright(f"{len(changed_slides)} of {len(slide_counts)} slides changed"))
+        changed_set = set(changed_slides)
+        self.capture_steps([step for step in steps if step[0] in changed_set])
+
+        # store the hashes only after all images are written
+        self.image_writer.close()
+        new_hashes = {}
+        for slide_count, key in slide_keys.items():
+            if slide_count in changed_set:
+                new_hashes[key] = hashes.get(slide_count)
             else:
-                # there is a subslide → we cannot use `has_next_slide` as indicator because it is
-                # missing on the last slide of a presentation if it has a subslide
-                # we use progress width instead
-                # note the progress bar luckily behaves differently if the the last slide has a subslide
-                if old_progress_width:
-                    width_diff = progress_width - old_progress_width
-                    print(f"{width_diff}")
-                    if width_diff == 0:
-                        # we've reached the end of the presentation
-                        break
-
-            # IPS(fragment_count>1)
-            old_progress_width = progress_width
+                new_hashes[key] = old_hashes[key]
+        all_slide_hashes[self.url] = new_hashes
+        self.save_slide_hashes(all_slide_hashes)
 
-        driver.quit()
+    def capture_shard(self, steps):
+        driver = self.create_driver()
+        try:
+            self.open_presentation(driver)
+            for slide_count, fragment_count, (h, v, f) in steps:
+                self.wait_for(driver, GOTO_SCRIPT, f"slide {h}/{v}, fragment index {f}", h, v, f)
+                self.save_screenshot(driver, slide_count, fragment_count)
+        finally:
+            driver.quit()
+
+    def wait_for(self, driver, script, description, *script_args):
+        """
+        execute one of the async scripts above; only warn on timeout (at the end of the deck nothing happens)
+        """
+        if not driver.execute_async_script(script, STEP_TIMEOUT * 1000, *script_args):
+            print(util.yellow(f"no reaction of the presentation after {STEP_TIMEOUT} s: {description}"))
 
 
 def main(args):
@@ -2,27 +2,179 @@
 Command line interface for autobrowser package
 """
 
+import os
+import sys
 import argparse
-from ipydex import IPS, activate_ips_on_exception
 
-activate_ips_on_exception()
+# note: all further imports happen inside the entry point functions (after the arguments are parsed)
+# such that e.g. `--help` responds immediately
+
+
+def activate_ips_on_exception():
+    from ipydex import activate_ips_on_exception
+
+    activate_ips_on_exception()
 
 
 def main():
 
-    from . import core
     parser = argparse.ArgumentParser()
     parser.add_argument("project_dir", help="specify project dir (see README)")
     parser.add_argument("--only-audio-preprocessing", "-oapp", help="only audio preprocessing", action="store_true")
     parser.add_argument("--audio-preprocessing", "-app", help="audio preprocessing, then video creation", action="store_true")
     parser.add_argument("--omit-snippet-production", "-osp", help="do not produce new snippets, but use existing", action="store_true")
     parser.add_argument("--snippet-limit", "-sl", help="do not produce new snippets, but use existing", default=None, type=int)
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        help="number of parallel jobs for snippet encoding and audio preprocessing (default: number of cpu cores)",
+        default=None,
+        type=int,
+    )
+    parser.add_argument(
+        "--render-mode",
+        "-rm",
+        help="'snippets': encode every image/audio pair separately, then concat (default); "
+        "'single-pass': encode the whole video with one ffmpeg call (no snippets)",
+        choices=["snippets", "single-pass"],
+        default="snippets",
+    )
+    parser.add_argument(
+        "--noise-profile",
+        "-np",
+        help="'per-file': estimate the noise of every file separately (default); "
+        "'noise-file': use audio/noise/noise.wav for all files; "
+        "'quiet-regions': use the quiet regions of all files",
+        choices=["per-file", "noise-file", "quiet-regions"],
+        default="per-file",
+    )
+    parser.add_argument(
+        "--loudness-normalization",
+        "-ln",
+        help="bring all preprocessed audio files to the same loudness (requires audio preprocessing)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--loudness-target",
+        "-lt",
+        help="target loudness in LUFS for --loudness-normalization (default: median of all fragments)",
+        default=None,
+        type=float,
+    )
+
+    parser.add_argument(
+        "--trim-silence",
+        "-ts",
+        help="remove silence at the beginning and the end of every recording (part of the audio preprocessing)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--trim-threshold",
+        help="for --trim-silence: frames more than this many dB below the loudest frame count as silence "
+        "(default: -35)",
+        default=-35.0,
+        type=float,
+    )
+    parser.add_argument(
+        "--trim-padding",
+        help="for --trim-silence: silence (in seconds) which is kept before and after the speech (default: 0.3)",
+        default=0.3,
+        type=float,
+    )
+    parser.add_argument(
+        "--max-image-height",
+        "-mih",
+        help="scale larger images down to this height before the snippets are encoded (default: keep the size)",
+        default=None,
+        type=int,
+    )
+    parser.add_argument(
+        "--output-profiles",
+        "-op",
+        help="comma separated list of renditions which are produced together by one ffmpeg call "
+        "(available: 1080p, 720p, 480p, webm); default: one mp4 without re-encoding",
+        default=None,
+        type=lambda arg: [name.strip() for name in arg.split(",") if name.strip()],
+    )
+    parser.add_argument(
+        "--segmented",
+        "-seg",
+        help="together with --output-profiles: additionally write hls or dash segments of every rendition "
+        "(available while the render is still running)",
+        choices=["hls", "dash"],
+        default=None,
+    )
+    parser.add_argument(
+        "--watch",
+        "-w",
+        help="after rendering, watch audio/, audio_pp/ and images/ and re-render the snippets of changed files",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile",
+        help="measure every stage (wall time, cpu time, i/o, subprocesses) and write profile_report.json",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cprofile",
+        help="write cProfile statistics of every stage to profile/<stage>.prof (implies --profile)",
+        action="store_true",
+    )
 
     args = parser.parse_args()
 
+    activate_ips_on_exception()
+    from . import core
     core.main(args)
 
 
+def video_script():
+    """
+    `video-script build <project-dir>`; without subcommand this is the deprecated alias of `video-script-tool`
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        sys.argv[0:2] = [f"{os.path.basename(sys.argv[0])} build"]
+        build()
+    else:
+        main()
+
+
+def build():
+
+    parser = argparse.ArgumentParser(
+        description="run all stages (capture, extraction, preprocessing, rendering) whose inputs changed"
+    )
+    parser.add_argument("project_dir", help="specify project dir (see README)")
+    parser.add_argument("--presentation-url", "-pu", help="capture the slides from this url", default=None)
+    parser.add_argument("--first-slide-number", "-fsn", help="specify first slide number", type=int, default=1)
+    parser.add_argument(
+        "--md-source-url", "-mu", help="markdown source for the text extraction (default: slides_full_source.md)",
+        default=None,
+    )
+    parser.add_argument("--audio-preprocessing", "-app", help="include the audio preprocessing", action="store_true")
+    parser.add_argument(
+        "--noise-profile", "-np", choices=["per-file", "noise-file", "quiet-regions"], default="per-file",
+        help="see video-script-tool --help",
+    )
+    parser.add_argument("--loudness-normalization", "-ln", help="see video-script-tool --help", action="store_true")
+    parser.add_argument("--loudness-target", "-lt", help="see video-script-tool --help", default=None, type=float)
+    parser.add_argument(
+        "--render-mode", "-rm", choices=["snippets", "single-pass"], default="snippets",
+        help="see video-script-tool --help",
+    )
+    parser.add_argument("--jobs", "-j", help="number of parallel jobs (default: number of cpu cores)", type=int, default=None)
+    parser.add_argument(
+        "--force", "-f", help="run this stage even if its inputs did not change (can be repeated)",
+        choices=["capture", "extraction", "preprocessing", "rendering"], action="append", default=[],
+    )
+    parser.add_argument("--dry-run", "-n", help="only show which stages would run", action="store_true")
+    args = parser.parse_args()
+
+    activate_ips_on_exception()
+    from . import build
+    build.main(args)
+
+
 def capture_slides():
 
     parser = argparse.ArgumentParser()
@@ -30,8 +182,32 @@ def capture_slides():
     parser.add_argument("url", help="specify url of presentation")
     parser.add_argument("--first-slide-number", "-fsn", help="specify first slide number", type=int, default=1)
     parser.add_argument("--suffix", help="set a path suffix like '_a'", default="")
+    parser.add_argument(
+        "--no-transitions", "-nt", help="disable slide and fragment transitions (faster capture)", action="store_true"
+    )
+    parser.add_argument(
+        "--browsers", "-b", help="capture parts of the deck with this many browsers in parallel", type=int, default=1
+    )
+    parser.add_argument(
+        "--crop",
+        help="crop the screenshots to this box (pixels), example: '0,0,1920,1000'",
+        type=lambda arg: tuple(int(value) for value in arg.split(",")),
+        default=None,
+    )
+    parser.add_argument(
+        "--optimize-png", "-op", help="compress the screenshots as much as possible (slower)", action="store_true"
+    )
+    parser.add_argument(
+        "--incremental", "-i", help="capture only the slides whose markdown source changed since the last capture",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--md-source", "-ms", help="markdown source (path or url) for --incremental (default: slides_full_source.md)",
+        default=None,
+    )
     args = parser.parse_args()
 
+    activate_ips_on_exception()
     from . import capture_slides
     capture_slides.main(args)
 
@@ -42,6 +218,7 @@ def record_audio_gui():
     parser.add_argument("project_dir", help="specify project dir (see README)")
     args = parser.parse_args()
 
+    activate_ips_on_exception()
     from . import gui
     gui.main(args)
 
@@ -61,6 +238,38 @@ def extract_texts():
 
     args = parser.parse_args()
 
+    activate_ips_on_exception()
     from . import md_processor
 
     md_processor.extract_text(args)
+
+
+def benchmark():
+
+    parser = argparse.ArgumentParser(description="time the pipeline stages on a synthetic project")
+    parser.add_argument("--slides", "-s", help="number of slides", type=int, default=10)
+    parser.add_argument("--fragments", "-f", help="number of fragments per slide", type=int, default=2)
+    parser.add_argument("--resolution", "-r", help="image resolution (e.g. 1920x1080)", default="1920x1080")
+    parser.add_argument("--audio-duration", "-ad", help="length of every recording in seconds", type=float, default=5.0)
+    parser.add_argument("--repetitions", "-n", help="number of repetitions (median is reported)", type=int, default=1)
+    parser.add_argument("--jobs", "-j", help="number of parallel jobs (default: number of cpu cores)", type=int, default=None)
+    parser.add_argument("--project-dir", help="where to create the project (default: temporary directory)", default=None)
+    parser.add_argument("--keep", help="do not delete the temporary project directory", action="store_true")
+    parser.add_argument("--output", "-o", help="json file for the results", default=None)
+    parser.add_argument("--compare", "-c", help="json file of an earlier run to compare with", default=None)
+    parser.add_argument(
+        "--startup",
+        help="only check the startup time of all entry points (`--help`), exit code 1 if one exceeds the budget",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    if args.startup:
+        from .benchmark import startup
+        if not startup.check_startup_times():
+            exit(1)
+        return
+
+    activate_ips_on_exception()
+    from .benchmark import runner
+    runner.main(args)
@@ -1,16 +1,19 @@
-import subprocess
 import os
 import glob
 import argparse
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from scipy.io import wavfile
 import numpy as np
-import noisereduce as nr
-import pedalboard as pb
 
 from . import util
+from . import audio_io
+from . import jobs
+from . import profiling
 
-from ipydex import IPS, Container
+# note: the heavy dsp dependencies (scipy, noisereduce, pedalboard) are imported only where they are needed
+# such that rendering without audio preprocessing does not pay for them
 
 
 class MainManager:
@@ -20,6 +23,18 @@ class MainManager:
         self.only_audio_preprocessing_flag = args.only_audio_preprocessing
         self.audio_preprocessing_flag = args.audio_preprocessing or args.only_audio_preprocessing
         self.snippet_limit = args.snippet_limit or float("inf")
+        self.jobs = args.jobs or os.cpu_count() or 1
+        self.render_mode = args.render_mode
+        self.noise_profile_mode = args.noise_profile
+        self.loudness_normalization_flag = args.loudness_normalization
+        self.loudness_target = args.loudness_target
+        self.trim_kwargs = None
+        if args.trim_silence:
+            self.trim_kwargs = {"threshold_db": args.trim_threshold, "padding": args.trim_padding}
+        self.watch_flag = args.watch
+        self.output_profiles = args.output_profiles or []
+        self.segmented_mode = args.segmented
+        self.max_image_height = args.max_image_height
 
         self.file_list_fpath = os.path.join(self.project_dir, "filelist.txt")
 
@@ -31,6 +46,30 @@ class MainManager:
         self.audio_dir_name = "audio"
         self.audio_pp_dir_name = "audio_pp"
         self.audio_pp_dirpath = os.path.join(self.project_dir, self.audio_pp_dir_name)
+        self.audio_pp_manifest_fpath = os.path.join(self.audio_pp_dirpath, "manifest.json")
+
+        # input hash of every preprocessed file (see `do_audio_preprocessing`)
+        self.audio_pp_hashes = {}
+        self.image_pp_dirpath = os.path.join(self.project_dir, "images_pp")
+        self.normalized_image_fpaths = {}
+
+        # hash of the normalized image for every image (identical images share the encoded video)
+        self.image_hashes = {}
+        self.snippet_dir_name = "snippets"
+        self.snippet_dirpath = os.path.join(self.project_dir, self.snippet_dir_name)
+        self.snippet_manifest = None
+        self.job_runner = jobs.JobRunner(max_workers=self.jobs)
+
+        # number of worker processes started for the audio preprocessing
+        self.n_worker_processes = 0
+
+        self.profiler = None
+        if args.profile or args.cprofile:
+            self.profiler = profiling.StageProfiler(
+                os.path.join(self.project_dir, "profile_report.json"),
+                use_cprofile=args.cprofile,
+                get_n_spawned=lambda: self.job_runner.n_spawned + self.n_worker_processes,
+            )
 
         self.data_loaded = False
 
@@ -38,14 +77,61 @@ class MainManager:
         if not self.produce_snippets_flag and self.only_audio_preprocessing_flag:
             msg = "Inconsistent arguments (preprocessing audio only possible during snippet production, but this is omitted)"
             raise ValueError(msg)
+        if self.loudness_normalization_flag and not self.audio_preprocessing_flag:
+            msg = "Inconsistent arguments (loudness normalization is part of the audio preprocessing)"
+            raise ValueError(msg)
+        if self.trim_kwargs is not None and not self.audio_preprocessing_flag:
+            msg = "Inconsistent arguments (silence trimming is part of the audio preprocessing)"
+            raise ValueError(msg)
+        if self.watch_flag and (self.render_mode != "snippets" or self.only_audio_preprocessing_flag):
+            msg = "Inconsistent arguments (watch mode requires snippet rendering)"
+            raise ValueError(msg)
+        unknown_profiles = [name for name in self.output_profiles if name not in OUTPUT_PROFILES]
+        if unknown_profiles:
+            msg = f"Unknown output profile(s): {unknown_profiles} (available: {list(OUTPUT_PROFILES)})"
+            raise ValueError(msg)
+        if self.segmented_mode and not self.output_profiles:
+            msg = "Inconsistent arguments (segmented output requires output profiles)"
+            raise ValueError(msg)
+
+        try:
+            self.run_stages()
+        finally:
+            if self.profiler is not None:
+                self.profiler.write_report()
+
+    def run_stages(self):
+        with self.profile_stage("load_data"):
+            self.load_data()
 
         if self.audio_preprocessing_flag:
-            self.do_audio_preprocessing()
+            with self.profile_stage("audio_preprocessing"):
+                self.do_audio_preprocessing()
+            if self.loudness_normalization_flag:
+                with self.profile_stage("loudness_normalization"):
+                    self.do_loudness_normalization()
             if self.only_audio_preprocessing_flag:
-                exit()
+                return
+        if self.render_mode == "single-pass":
+            with self.profile_stage("single_pass"):
+                self.render_single_pass()
+            return
         if self.produce_snippets_flag:
-            self.produce_snippets()
-        self.create_video()
+            with self.profile_stage("produce_snippets"):
+                self.produce_snippets()
+        with self.profile_stage("concat"):
+            self.create_video()
+
+        if self.watch_flag:
+            self.watch_project()
+
+    def profile_stage(self, name):
+        """
+        return a context manager which measures the enclosed stage (if profiling is enabled)
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(name)
 
     def load_data(self):
 
@@ -62,7 +148,8 @@ class MainManager:
         if not os.path.isfile(self.noise_fpath):
             self.noise_fpath = None
         else:
-            _, self.noise_data = wavfile.read(self.noise_fpath)
+            self.noise_rate, noise_data = audio_io.read_wav_mmap(self.noise_fpath)
+            self.noise_data = audio_io.mono_view(noise_data)
 
         pattern_img = os.path.join(self.project_dir, "images", "*.png")
         self.image_files = glob.glob(pattern_img)
@@ -79,48 +166,167 @@ class MainManager:
 
         os.makedirs(self.audio_pp_dirpath, exist_ok=True)
 
-        for i, audio_fpath in enumerate(self.audio_files, start=1):
+        # outputs are reused if neither the source file nor any parameter changed since the last run
+        manifest = util.HashManifest(self.audio_pp_manifest_fpath)
+        audio_files = self.audio_files[:min(len(self.audio_files), self.snippet_limit)]
+        params = get_preprocessing_params()
+        params["noise_profile"] = self.noise_profile_mode
+        params["trim_silence"] = self.trim_kwargs
 
-            rate, audio_data = wavfile.read(audio_fpath)
+        # the loudness normalization rewrites the outputs (see `do_loudness_normalization`)
+        params["loudness_normalization"] = self.loudness_normalization_flag
+        params["loudness_target"] = self.loudness_target
+        if self.noise_profile_mode == "noise-file":
+            if self.noise_fpath is None:
+                msg = "noise profile mode 'noise-file' requires audio/noise/noise.wav"
+                raise FileNotFoundError(msg)
+            params["noise_file_hash"] = util.get_content_hash(self.noise_fpath)
+        elif self.noise_profile_mode == "quiet-regions":
+            # the profile depends on all files
+            params["quiet_regions_hash"] = util.get_content_hash(*audio_files)
 
-            # separate noise file currently not used
+        pp_jobs = []
+        for audio_fpath in audio_files:
+            target_fpath = self.get_adapted_audio_fpath(audio_fpath, force_adapted_path=True)
+            input_hash = util.get_content_hash(audio_fpath, extra=params)
+            self.audio_pp_hashes[target_fpath] = input_hash
+            if manifest.is_up_to_date(target_fpath, input_hash):
+                print(f"File unchanged: {target_fpath}")
+            else:
+                manifest.remove(target_fpath)
+                pp_jobs.append((audio_fpath, target_fpath, input_hash))
 
-            # assert self.noise_data is not None
-            # _, noise = wavfile.read(self.noise_fpath)
+        # list of tasks: (function, args, {target_fpath: input_hash})
+        tasks = []
+        if self.noise_profile_mode == "per-file":
+            for audio_fpath, target_fpath, input_hash in pp_jobs:
+                args = (audio_fpath, target_fpath, self.trim_kwargs)
+                tasks.append((preprocess_audio_file, args, {target_fpath: input_hash}))
+        elif pp_jobs:
+            noise_profile = self.create_noise_profile(audio_files)
+            lengths = []
+            for audio_fpath, _, _ in pp_jobs:
+                header = audio_io.read_wav_header(audio_fpath)
+                lengths.append(header.n_frames if header is not None else NOISE_PROFILE_BATCH_SAMPLES)
+            for batch in split_into_batches(pp_jobs, lengths, NOISE_PROFILE_BATCH_SAMPLES):
+                fpath_pairs = [(audio_fpath, target_fpath) for audio_fpath, target_fpath, _ in batch]
+                target_hashes = {target_fpath: input_hash for _, target_fpath, input_hash in batch}
+                tasks.append((preprocess_audio_batch, (fpath_pairs, noise_profile, self.trim_kwargs), target_hashes))
 
-            if len(audio_data.shape) == 2:
-                # the wav was recorded with stereo -> select first channel
-                audio_data = audio_data[:, 0]
+        def task_finished(target_hashes, durations):
+            for target_fpath, input_hash in target_hashes.items():
+                manifest.update(target_fpath, input_hash)
+                # the snippet production does not need to read the header again
+                util.register_audio_duration(target_fpath, durations[target_fpath])
+                print(f"File written: {target_fpath} ({durations[target_fpath]:.1f} s)")
 
-            reduced_noise_audio = nr.reduce_noise(y=audio_data, sr=rate, stationary=True, prop_decrease=0.75)
+        try:
+            if self.jobs == 1:
+                for func, args, target_hashes in tasks:
+                    task_finished(target_hashes, func(*args))
+            else:
+                # every worker process runs the complete pipeline (read, dsp, write) for one task at a time
+                # -> while one worker waits for reading or writing the others perform the dsp
+                # the pool starts at most one worker per task
+                self.n_worker_processes += min(self.jobs, len(tasks))
+                with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                    future_to_hashes = {
+                        executor.submit(func, *args): target_hashes for func, args, target_hashes in tasks
+                    }
+                    for future in as_completed(future_to_hashes):
+                        task_finished(future_to_hashes[future], future.result())
+        finally:
+            # keep the information about the successfully processed files (also in case of an error)
+            manifest.save()
 
-            # perform more Audio filtering
+        self.use_preprocessed_audio = True
 
-            board = pb.Pedalboard([
-                pb.NoiseGate(threshold_db=-30, ratio=1.5, release_ms=250),
-                pb.Compressor(threshold_db=-16, ratio=2.5),
-                #pb.LowShelfFilter(cutoff_frequency_hz=400, gain_db=10, q=1),
-                pb.LowShelfFilter(cutoff_frequency_hz=200, gain_db=10, q=1),
-                # this leads to clipping
-                # pb.Gain(gain_db=10)
-            ])
+    def do_loudness_normalization(self):
+        """
+        Measure the integrated loudness of all preprocessed files and apply a gain to each file such that all
+        fragments reach the same loudness (`self.loudness_target` in LUFS, default: median of all fragments).
+        """
+        from . import dsp
 
-            # Pedalboard expects floating point data
-            # By convention, floating point audio data is normalized to the range of [-1.0,1.0]
-            # https://stackoverflow.com/a/42544738
+        print("perform loudness normalization")
+        self.load_data()
 
-            rescaled_audio = reduced_noise_audio.astype(np.float32, order='C') / 32768.0
-            resulting_audio = board(rescaled_audio, rate)
+        audio_files = self.audio_files[:min(len(self.audio_files), self.snippet_limit)]
+        pp_fpaths = [self.get_adapted_audio_fpath(fpath, force_adapted_path=True) for fpath in audio_files]
 
-            target_fpath = self.get_adapted_audio_fpath(audio_fpath, force_adapted_path=True)
+        loudness_values = []
+        for fpath in pp_fpaths:
+            rate, audio_data = audio_io.read_wav_mmap(fpath)
+            loudness_values.append(dsp.integrated_loudness(audio_io.mono_view(audio_data), rate))
+        loudness_values = np.array(loudness_values)
 
-            wavfile.write(target_fpath, rate, resulting_audio)
-            print(f"File written: {target_fpath}")
+        if self.loudness_target is None:
+            target = np.median(loudness_values[np.isfinite(loudness_values)])
+        else:
+            target = self.loudness_target
+        print(f"loudness target: {target:.1f} LUFS")
 
-            if i >= self.snippet_limit:
-                break
+        # a file which is being rewritten is not up to date anymore (e.g. if the process is interrupted);
+        # after writing it gets the hash of the preprocessing (whose parameters include the normalization)
+        manifest = util.HashManifest(self.audio_pp_manifest_fpath)
 
-        self.use_preprocessed_audio = True
+        for fpath, loudness in zip(pp_fpaths, loudness_values):
+            if not np.isfinite(loudness):
+                print(util.yellow(f"silent file (no loudness normalization): {fpath}"))
+                continue
+
+            rate, audio_data = audio_io.read_wav_mmap(fpath)
+            audio_data = audio_io.mono_view(audio_data)
+
+            # prevent clipping (keep the peak level at most at -1 dBFS)
+            gain_db = target - loudness
+            peak = dsp.peak_amplitude(audio_data)
+            max_gain_db = -1 - 20 * np.log10(peak) if peak > 0 else gain_db
+            if gain_db > max_gain_db:
+                print(util.yellow(f"gain limited to {max_gain_db:.1f} dB (instead of {gain_db:.1f} dB): {fpath}"))
+                gain_db = max_gain_db
+
+            # files which are already normalized (e.g. from a previous run) are not written again
+            if abs(gain_db) < 0.1:
+                continue
+
+            manifest.remove(fpath)
+            manifest.save()
+
+            # the old file is still mapped -> write a new file block by block and replace the old one afterwards
+            tmp_fpath = f"{fpath}.tmp"
+            gain = np.float32(10 ** (gain_db / 20))
+            block_size = LOUDNESS_BLOCK_SIZE
+            with audio_io.WavWriter(tmp_fpath, rate) as writer:
+                for start in range(0, len(audio_data), block_size):
+                    writer.write(np.asarray(audio_data[start:start + block_size], dtype=np.float32) * gain)
+                    audio_io.release_pages(audio_data)
+            os.replace(tmp_fpath, fpath)
+            print(f"{gain_db:+5.1f} dB: {fpath}")
+
+            if fpath in self.audio_pp_hashes:
+                manifest.update(fpath, self.audio_pp_hashes[fpath])
+                manifest.save()
+
+    def create_noise_profile(self, audio_files):
+        """
+        Compute the noise profile once for the whole project
+        (from audio/noise/noise.wav or from the quiet regions of all files).
+        """
+        from . import dsp
+
+        print(f"computing noise profile ({self.noise_profile_mode})")
+        if self.noise_profile_mode == "noise-file":
+            return dsp.NoiseProfile.from_signal(self.noise_data, self.noise_rate)
+
+        signals = []
+        rates = set()
+        for audio_fpath in audio_files:
+            rate, audio_data = audio_io.read_wav_mmap(audio_fpath)
+            signals.append(audio_io.mono_view(audio_data))
+            rates.add(rate)
+        assert len(rates) == 1, "all audio files must have the same sample rate"
+        return dsp.NoiseProfile.from_quiet_regions(signals, rates.pop())
 
     def get_adapted_audio_fpath(self, audio_fpath, force_adapted_path=False):
         if self.use_preprocessed_audio or force_adapted_path:
@@ -129,74 +335,833 @@ class MainManager:
             return audio_fpath
 
 
-    def create_video(self, produce_snippets=True):
-
+    def get_output_fpath(self, profile_name=None, extension="mp4"):
         if self.use_preprocessed_audio:
             ppa_part = "_ppa"
         else:
             ppa_part = ""
-        output_path = os.path.join(self.project_dir, f"combined-video{ppa_part}.mp4")
-        cmd = " ".join(
-            ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", self.file_list_fpath, "-c", "copy", output_path]
-        )
+        profile_part = f"_{profile_name}" if profile_name else ""
+        return os.path.join(self.project_dir, f"combined-video{ppa_part}{profile_part}.{extension}")
 
-        os.system(cmd)
+    def create_video(self, produce_snippets=True):
 
-    def produce_snippets(self):
+        if self.output_profiles:
+            input_args = ["-f", "concat", "-safe", "0", "-i", self.file_list_fpath]
+            # the snippets already contain aac audio
+            self.render_output_profiles(input_args, video_input="0:v", audio_input="0:a", audio_is_aac=True)
+            return
 
-        self.load_data()
-        SNIPPET_DIR = "snippets"  # relative to project_dir
-        SNIPPET_DIR_FULL = os.path.join(self.project_dir, SNIPPET_DIR)
+        output_path = self.get_output_fpath()
+        cmd_list = [
+            "ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", self.file_list_fpath,
+            "-c", "copy", output_path
+        ]
+        self.run_ffmpeg(cmd_list, label="concat")
+        print(f"File written: {output_path}")
 
-        os.makedirs(SNIPPET_DIR_FULL, exist_ok=True)
+    def render_output_profiles(
+        self, input_args, video_input, audio_input, video_filter=None, audio_is_aac=False, output_args=(),
+        duration=None,
+    ):
+        """
+        Produce all renditions of `self.output_profiles` with one ffmpeg invocation: the inputs are decoded once,
+        the video is split and scaled for every profile. In segmented mode every encoded rendition is written to
+        a file and (via the tee muxer) to HLS/DASH segments which become available while the render is running.
+        """
 
-        file_list_entries = []
+        n = len(self.output_profiles)
+        prefilter = f"{video_filter}," if video_filter else ""
+        filter_parts = [f"[{video_input}]{prefilter}split={n}" + "".join(f"[v{k}]" for k in range(n))]
+        cmd_list = ["ffmpeg", "-y", "-loglevel", "error", *input_args]
+        output_cmd_list = []
+        output_fpaths = []
+
+        for k, name in enumerate(self.output_profiles):
+            profile = OUTPUT_PROFILES[name]
+            if profile["height"]:
+                # no upscaling of smaller images; the width stays even (required by yuv420p)
+                filter_parts.append(f"[v{k}]scale=-2:min(ih\\,{profile['height']})[out{k}]")
+            else:
+                filter_parts.append(f"[v{k}]null[out{k}]")
+
+            output_cmd_list.extend(["-map", f"[out{k}]", "-map", audio_input, *profile["video_args"]])
+            output_cmd_list.extend(["-pix_fmt", "yuv420p"])
+            # the audio of the mp4 profiles is the same as that of the snippets
+            if audio_is_aac and profile["audio_args"][:2] == ["-c:a", "aac"]:
+                output_cmd_list.extend(["-c:a", "copy"])
+            else:
+                output_cmd_list.extend(profile["audio_args"])
+            output_cmd_list.extend(output_args)
+
+            output_fpath = self.get_output_fpath(name, extension=profile["extension"])
+            output_fpaths.append(output_fpath)
+            segment_target = self.get_segment_target(name, profile)
+            if segment_target is None:
+                output_cmd_list.append(output_fpath)
+            else:
+                output_fpaths.append(segment_target[1])
+                tee_spec = f"[f={profile['extension']}]{output_fpath}|{segment_target[0]}"
+                output_cmd_list.extend(["-flags", "+global_header", "-f", "tee", tee_spec])
+
+        cmd_list.extend(["-filter_complex", ";".join(filter_parts), *output_cmd_list])
+        self.run_ffmpeg(cmd_list, label=f"renditions ({', '.join(self.output_profiles)})", duration=duration)
+        for output_fpath in output_fpaths:
+            print(f"File written: {output_fpath}")
+
+    def get_segment_target(self, name, profile):
+        """
+        return (tee output specification, playlist fpath) for the segmented output of one profile
+        (or None if there is no segmented output)
+        """
+        if self.segmented_mode is None:
+            return None
+        if self.segmented_mode == "hls" and profile["extension"] != "mp4":
+            print(util.yellow(f"hls is only available for mp4 profiles (no segments for {name})"))
+            return None
+
+        base_fpath, _ = os.path.splitext(self.get_output_fpath(name))
+        segment_dirpath = f"{base_fpath}_{self.segmented_mode}"
+        os.makedirs(segment_dirpath, exist_ok=True)
+
+        # note: the tee muxer uses ":" to separate options (paths must not contain ":")
+        segment_duration = SEGMENT_DURATION
+        if self.segmented_mode == "hls":
+            playlist_fpath = os.path.join(segment_dirpath, "index.m3u8")
+            segment_pattern = os.path.join(segment_dirpath, "segment_%05d.ts")
+            options = f"f=hls:hls_time={segment_duration}:hls_list_size=0:hls_segment_filename={segment_pattern}"
+        else:
+            playlist_fpath = os.path.join(segment_dirpath, "manifest.mpd")
+            options = f"f=dash:seg_duration={segment_duration}"
+            if profile["extension"] == "webm":
+                options += ":dash_segment_type=webm"
+        return f"[{options}]{playlist_fpath}", playlist_fpath
+
+    def run_ffmpeg(self, cmd_list, label, duration=None):
+        """
+        run a single ffmpeg job (raise an error if it fails)
+        """
+        job, = self.job_runner.run([jobs.FFmpegJob(cmd_list, label=label, duration=duration)])
+        if job.failed:
+            print(job.stderr)
+            msg = f"ffmpeg failed ({label}, exit code {job.returncode})"
+            raise RuntimeError(msg)
+        print(f"{label}: {job.wall_time:.1f} s wall time, {job.cpu_time or 0:.1f} s cpu time")
+        return job
+
+    def render_single_pass(self):
+        """
+        Render the whole video with one ffmpeg invocation (no intermediate snippets):
+        all wav files are concatenated to one audio track and the images form one timeline
+        where each image is shown as long as its audio file lasts.
+        """
+
+        self.load_data()
+
+        image_timeline_entries = ["ffconcat version 1.0"]
+        audio_list_entries = ["ffconcat version 1.0"]
+        total_duration = 0
         for i, (image_fpath, audio_fpath) in enumerate(zip(self.image_files, self.audio_files), start=1):
+            audio_fpath = self.get_adapted_audio_fpath(audio_fpath)
             duration = util.get_audio_duration(audio_fpath)
 
-            audio_fpath = self.get_adapted_audio_fpath(audio_fpath)
-            video_snippet_fpath_full = os.path.join(SNIPPET_DIR_FULL, f"temp{i:04d}.mp4")
+            image_timeline_entries.append(f"file {quote_concat_path(image_fpath)}")
+            image_timeline_entries.append(f"duration {duration}")
+            total_duration += duration
+            audio_list_entries.append(f"file {quote_concat_path(audio_fpath)}")
 
-            cmd_list = [
-                "ffmpeg",
-                "-y",  # overwrite existing files
-                "-loop",
-                "1",
-                "-i",
-                image_fpath,
-                "-i",
-                audio_fpath,
-                "-c:v",
-                "libx264",
-                '-vf "pad=ceil(iw/2)*2:ceil(ih/2)*2"',  # this deals with uneven image formats
-                "-tune",
-                "stillimage",
-                "-c:a",
-                "aac",
-                "-b:a",
-                "192k",
-                "-pix_fmt",
-                "yuv420p",
-                "-t",
-                str(duration),
-                video_snippet_fpath_full,
-            ]
+            if i >= self.snippet_limit:
+                break
+
+        # the concat demuxer ignores the duration of the last entry unless the file is repeated
+        image_timeline_entries.append(image_timeline_entries[-2])
+
+        image_timeline_fpath = os.path.join(self.project_dir, "image_timeline.txt")
+        audio_list_fpath = os.path.join(self.project_dir, "audio_list.txt")
+        for fpath, entries in ((image_timeline_fpath, image_timeline_entries), (audio_list_fpath, audio_list_entries)):
+            with open(fpath, "w") as fp:
+                fp.write("\n".join(entries))
+                fp.write("\n")
+
+        input_args = [
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            image_timeline_fpath,
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            audio_list_fpath,
+        ]
+        if self.output_profiles:
+            self.render_output_profiles(
+                input_args,
+                video_input="0:v",
+                audio_input="1:a",
+                # constant frame rate (same as the snippets), even size
+                video_filter="fps=25,pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                output_args=["-t", str(total_duration)],
+                duration=total_duration,
+            )
+            return
+
+        output_path = self.get_output_fpath()
+        cmd_list = [
+            "ffmpeg",
+            "-y",  # overwrite existing files
+            "-loglevel",
+            "error",
+            *input_args,
+            "-map",
+            "0:v",
+            "-map",
+            "1:a",
+            "-c:v",
+            "libx264",
+            "-vf",
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2",  # this deals with uneven image formats
+            "-r",
+            "25",  # constant frame rate (same as the snippets)
+            "-tune",
+            "stillimage",
+            "-c:a",
+            "aac",
+            "-b:a",
+            "192k",
+            "-pix_fmt",
+            "yuv420p",
+            "-t",
+            str(total_duration),
+            output_path,
+        ]
+
+        self.run_ffmpeg(cmd_list, label="single-pass", duration=total_duration)
+        print(f"File written: {output_path}")
+
+    def produce_snippets(self):
+
+        self.load_data()
+        os.makedirs(self.snippet_dirpath, exist_ok=True)
+
+        # only snippets whose inputs changed since the last run are encoded again
+        self.snippet_manifest = util.HashManifest(os.path.join(self.snippet_dirpath, "manifest.json"))
 
-            cmd = " ".join(cmd_list)
-            os.system(cmd)
+        n_snippets = int(min(len(self.image_files), self.snippet_limit))
+        self.normalize_images(self.image_files[:n_snippets])
 
+        self.report_similar_images(n_snippets)
+
+        file_list_entries = []
+        for i in range(1, n_snippets + 1):
             # ffmpeg expects the paths in the filelist relative to the path of the filelist
             # ffmpeg also needs slashes (even on windows); backslashes lead to problems
-            video_snippet_fpath_rel = f"{SNIPPET_DIR}/temp{i:04d}.mp4"
+            video_snippet_fpath_rel = f"{self.snippet_dir_name}/{self.get_snippet_fname(i)}"
             file_list_entries.append(f"file {video_snippet_fpath_rel}")
 
-            if i >= self.snippet_limit:
-                break
+        self.encode_snippets(range(1, n_snippets + 1))
+        self.job_runner.print_timing_report()
 
-        if 1:
-            with open(self.file_list_fpath, "w") as fp:
-                fp.write("\n".join(file_list_entries))
-                fp.write("\n")
+        with open(self.file_list_fpath, "w") as fp:
+            fp.write("\n".join(file_list_entries))
+            fp.write("\n")
+
+    def encode_snippets(self, indices) -> int:
+        """
+        Encode the snippets with the given (1-based) indices unless they are up to date; return the number of
+        encoded snippets.
+
+        If the same image occurs several times, its video stream is encoded only once (`shared_*.mp4`, as long as
+        the longest of these snippets) and every snippet only muxes its own audio to this stream.
+        """
+
+        n_snippets = int(min(len(self.image_files), self.snippet_limit))
+        image_groups = {}
+        for i in range(1, n_snippets + 1):
+            image_groups.setdefault(self.image_hashes[self.image_files[i - 1]], []).append(i)
+
+        shared_video_jobs = {}
+        snippet_jobs = []
+        mux_jobs = []
+        for i in indices:
+            image_fpath = self.image_files[i - 1]
+            audio_fpath = self.get_adapted_audio_fpath(self.audio_files[i - 1])
+            image_hash = self.image_hashes[image_fpath]
+            group = image_groups[image_hash]
+            if len(group) == 1:
+                job = self.create_snippet_job(i, image_fpath, audio_fpath)
+                if job is not None:
+                    snippet_jobs.append(job)
+                continue
+
+            shared_video_fpath = os.path.join(self.snippet_dirpath, f"shared_{image_hash[:16]}.mp4")
+            if image_hash not in shared_video_jobs:
+                durations = [
+                    util.get_audio_duration(self.get_adapted_audio_fpath(self.audio_files[k - 1])) for k in group
+                ]
+                shared_video_jobs[image_hash] = self.create_shared_video_job(
+                    image_fpath, shared_video_fpath, max(durations)
+                )
+            job = self.create_snippet_job(i, image_fpath, audio_fpath, shared_video_fpath=shared_video_fpath)
+            if job is not None:
+                mux_jobs.append(job)
+
+        shared_video_jobs = [job for job in shared_video_jobs.values() if job is not None]
+        n_reused = sum(len(group) - 1 for group in image_groups.values())
+        print(
+            f"producing {len(snippet_jobs) + len(mux_jobs)} snippets ({self.jobs} parallel jobs); "
+            f"{n_reused} repeated images reuse an encoded video stream"
+        )
+
+        # the shared videos are needed by the mux jobs
+        self.run_cached_jobs(shared_video_jobs + snippet_jobs, self.snippet_manifest)
+        self.run_cached_jobs(mux_jobs, self.snippet_manifest)
+        return len(snippet_jobs) + len(mux_jobs)
+
+    def run_cached_jobs(self, job_list, manifest):
+        """
+        run the jobs, keep the manifest up to date and raise an error if a job failed
+        """
+        failed_jobs = []
+        try:
+            for job in self.job_runner.run(job_list):
+                if job.failed:
+                    manifest.remove(job.target_fpath)
+                    failed_jobs.append(job)
+                else:
+                    manifest.update(job.target_fpath, job.input_hash)
+                    print(f"File written: {job.target_fpath}")
+        finally:
+            manifest.save()
+
+        if failed_jobs:
+            for job in failed_jobs:
+                print(util.bred(f"{job.label} failed: {job.description}"))
+                print(job.stderr)
+            failed_labels = [job.label for job in failed_jobs]
+            msg = f"ffmpeg failed for {len(failed_labels)} job(s): {failed_labels}"
+            raise RuntimeError(msg)
+
+    def report_similar_images(self, n_snippets, max_distance=2):
+        """
+        Warn about consecutive images which are not identical but look almost the same (e.g. a fragment step
+        which was detected twice by the slide capture). These are not merged because a subtle change might be
+        intended.
+        """
+        image_fpaths = self.image_files[:n_snippets]
+        dhashes = [get_frame_dhash(self.normalized_image_fpaths[fpath]) for fpath in image_fpaths]
+        for k in range(1, len(image_fpaths)):
+            if self.image_hashes[image_fpaths[k - 1]] == self.image_hashes[image_fpaths[k]]:
+                continue
+            if np.count_nonzero(dhashes[k - 1] != dhashes[k]) <= max_distance:
+                print(util.yellow(f"almost identical images: {image_fpaths[k - 1]}, {image_fpaths[k]}"))
+
+    def watch_project(self, poll_interval=0.5, debounce=2.0):
+        """
+        Keep the video up to date while recordings or images change: the snippet of every new or changed
+        file is encoded again immediately, the concat is redone once no further change arrived for `debounce`
+        seconds. Runs until Ctrl-C is pressed.
+        """
+        from . import watch
+
+        audio_dirpath = os.path.join(self.project_dir, self.audio_dir_name)
+        image_dirpath = os.path.join(self.project_dir, "images")
+        poller = watch.DirectoryPoller([audio_dirpath, self.audio_pp_dirpath, image_dirpath])
+
+        print(util.bright(f"watching {audio_dirpath}, {self.audio_pp_dirpath}, {image_dirpath} (stop with Ctrl-C)"))
+        concat_pending = False
+        last_change_time = 0
+        try:
+            while True:
+                time.sleep(poll_interval)
+                changed_fpaths, removed_fpaths = poller.poll()
+                if changed_fpaths or removed_fpaths:
+                    last_change_time = time.monotonic()
+                    try:
+                        concat_pending |= self.handle_changed_files(changed_fpaths, removed_fpaths)
+                    except (RuntimeError, AssertionError) as ex:
+                        # e.g. a recording is missing for a new image -> wait for further changes
+                        print(util.bred(f"{type(ex).__name__}: {ex}"))
+
+                if concat_pending and time.monotonic() - last_change_time > debounce:
+                    self.create_video()
+                    concat_pending = False
+        except KeyboardInterrupt:
+            print("\nwatch mode stopped")
+
+    def handle_changed_files(self, changed_fpaths, removed_fpaths) -> bool:
+        """
+        encode the snippets affected by the changed files; return True if the concat has to be redone
+        """
+
+        old_file_names = [os.path.basename(fpath) for fpath in self.image_files + self.audio_files]
+        self.data_loaded = False
+        self.load_data()
+        new_file_names = [os.path.basename(fpath) for fpath in self.image_files + self.audio_files]
+
+        audio_dirpath = os.path.join(self.project_dir, self.audio_dir_name)
+        changed_audio_fpaths = [fpath for fpath in changed_fpaths if os.path.dirname(fpath) == audio_dirpath]
+        if self.audio_preprocessing_flag and changed_audio_fpaths:
+            # only the changed files are processed again (see manifest)
+            self.do_audio_preprocessing()
+            if self.loudness_normalization_flag:
+                self.do_loudness_normalization()
+
+        if removed_fpaths or old_file_names != new_file_names:
+            # the indices of the snippets changed -> check all of them (unchanged snippets are reused)
+            self.produce_snippets()
+            return True
+
+        if self.snippet_manifest is None:
+            # snippet production was omitted at startup
+            self.snippet_manifest = util.HashManifest(os.path.join(self.snippet_dirpath, "manifest.json"))
+
+        changed_names = {os.path.basename(fpath) for fpath in changed_fpaths}
+        n_snippets = int(min(len(self.image_files), self.snippet_limit))
+
+        # (only the changed images are converted again)
+        self.normalize_images(self.image_files[:n_snippets])
+        indices = [
+            i for i, (image_fpath, audio_fpath) in enumerate(zip(self.image_files, self.audio_files), start=1)
+            if i <= n_snippets
+            and (os.path.basename(image_fpath) in changed_names or os.path.basename(audio_fpath) in changed_names)
+        ]
+        return self.encode_snippets(indices) > 0
+
+    def normalize_images(self, image_fpaths):
+        """
+        Bring every image once into the form the encoder needs (scaled to at most `self.max_image_height`, even
+        size, yuv420p) and store it as a single-frame y4m file in images_pp/. The snippet encoding then reads the
+        raw frame instead of decoding, padding and converting the png for every frame.
+        """
+
+        os.makedirs(self.image_pp_dirpath, exist_ok=True)
+        manifest = util.HashManifest(os.path.join(self.image_pp_dirpath, "manifest.json"))
+
+        video_filter = "pad=ceil(iw/2)*2:ceil(ih/2)*2"  # this deals with uneven image formats
+        if self.max_image_height:
+            video_filter = f"scale=-2:min(ih\\,{self.max_image_height}),{video_filter}"
+
+        normalization_jobs = []
+        for image_fpath in image_fpaths:
+            basename = os.path.splitext(os.path.basename(image_fpath))[0]
+            target_fpath = os.path.join(self.image_pp_dirpath, f"{basename}.y4m")
+            self.normalized_image_fpaths[image_fpath] = target_fpath
+
+            cmd_list = [
+                "ffmpeg", "-y", "-loglevel", "error", "-i", image_fpath, "-vf", video_filter, "-frames:v", "1",
+                "-pix_fmt", "yuv420p", "-f", "yuv4mpegpipe", target_fpath,
+            ]
+            path_args = (image_fpath, target_fpath)
+            input_hash = util.get_content_hash(image_fpath, extra=[arg for arg in cmd_list if arg not in path_args])
+
+            # byte-identical images (e.g. repeated fragment screenshots) get the same hash
+            self.image_hashes[image_fpath] = input_hash
+            if manifest.is_up_to_date(target_fpath, input_hash):
+                continue
+            job = jobs.FFmpegJob(cmd_list, label=f"image {basename}", description=image_fpath)
+            job.target_fpath = target_fpath
+            job.input_hash = input_hash
+            normalization_jobs.append(job)
+
+        if not normalization_jobs:
+            return
+        print(f"normalizing {len(normalization_jobs)} images ({self.jobs} parallel jobs)")
+        self.run_cached_jobs(normalization_jobs, manifest)
+
+    def get_snippet_fname(self, i):
+        return f"temp{i:04d}.mp4"
+
+    def create_snippet_job(self, i, image_fpath, audio_fpath, shared_video_fpath=None) -> jobs.FFmpegJob:
+        """
+        return the job which encodes one image/audio pair to a video snippet (or None if the snippet is up to date)
+
+        :param shared_video_fpath:  already encoded video stream of the image (only the audio is muxed to it)
+        """
+
+        duration = util.get_audio_duration(audio_fpath)
+        video_snippet_fpath_full = os.path.join(self.snippet_dirpath, self.get_snippet_fname(i))
+
+        # the image is already scaled, padded and converted (see normalize_images)
+        normalized_image_fpath = self.normalized_image_fpaths[image_fpath]
+
+        if shared_video_fpath is None:
+            video_args = ["-stream_loop", "-1", "-i", normalized_image_fpath, "-i", audio_fpath, *SNIPPET_VIDEO_ARGS]
+        else:
+            video_args = ["-i", shared_video_fpath, "-i", audio_fpath, "-map", "0:v", "-map", "1:a", "-c:v", "copy"]
+
+        cmd_list = [
+            "ffmpeg",
+            "-y",  # overwrite existing files
+            "-loglevel",
+            "error",
+            *video_args,
+            "-c:a",
+            "aac",
+            "-b:a",
+            "192k",
+            "-t",
+            str(duration),
+            video_snippet_fpath_full,
+        ]
+
+        # the paths do not matter for the result (only the content of the files does)
+        # the hash of the image (png and normalization arguments, see normalize_images) stands for the content of
+        # the (large) normalized image and of the shared video
+        path_args = (normalized_image_fpath, shared_video_fpath, audio_fpath, video_snippet_fpath_full)
+        input_hash = util.get_content_hash(
+            audio_fpath, extra=[self.image_hashes[image_fpath]] + [arg for arg in cmd_list if arg not in path_args]
+        )
+        if self.snippet_manifest.is_up_to_date(video_snippet_fpath_full, input_hash):
+            print(f"snippet unchanged: {video_snippet_fpath_full}")
+            return None
+
+        job = jobs.FFmpegJob(
+            cmd_list, label=f"snippet {i}", duration=duration, description=f"{image_fpath}, {audio_fpath}"
+        )
+        job.target_fpath = video_snippet_fpath_full
+        job.input_hash = input_hash
+        return job
+
+    def create_shared_video_job(self, image_fpath, target_fpath, duration) -> jobs.FFmpegJob:
+        """
+        return the job which encodes the video stream (no audio) of an image which is used by several snippets
+        (or None if it is up to date)
+        """
+        normalized_image_fpath = self.normalized_image_fpaths[image_fpath]
+        cmd_list = [
+            "ffmpeg", "-y", "-loglevel", "error", "-stream_loop", "-1", "-i", normalized_image_fpath,
+            *SNIPPET_VIDEO_ARGS, "-an", "-t", str(duration), target_fpath,
+        ]
+        path_args = (normalized_image_fpath, target_fpath)
+        input_hash = util.get_content_hash(
+            extra=[self.image_hashes[image_fpath]] + [arg for arg in cmd_list if arg not in path_args]
+        )
+        if self.snippet_manifest.is_up_to_date(target_fpath, input_hash):
+            return None
+
+        label = f"shared video {os.path.basename(image_fpath)}"
+        job = jobs.FFmpegJob(cmd_list, label=label, duration=duration, description=image_fpath)
+        job.target_fpath = target_fpath
+        job.input_hash = input_hash
+        return job
+
+
+# encoder settings of the video stream of the snippets (all snippets must match for the concat without re-encoding)
+SNIPPET_VIDEO_ARGS = ["-c:v", "libx264", "-tune", "stillimage", "-pix_fmt", "yuv420p"]
+
+
+def get_frame_dhash(y4m_fpath, hash_size=8):
+    """
+    Return the difference hash (boolean array) of the luma plane of a single-frame y4m file.
+    Only a grid of sample rows is read from the file.
+    """
+    with open(y4m_fpath, "rb") as fp:
+        header = fp.readline().split()
+        # "FRAME" line
+        fp.readline()
+        offset = fp.tell()
+    width = int(next(token[1:] for token in header if token.startswith(b"W")))
+    height = int(next(token[1:] for token in header if token.startswith(b"H")))
+
+    luma = np.memmap(y4m_fpath, dtype=np.uint8, mode="r", offset=offset, shape=(height, width))
+    rows = np.linspace(0, height - 1, 4 * hash_size).astype(int)
+    cols = np.linspace(0, width - 1, 4 * (hash_size + 1)).astype(int)
+    samples = luma[rows][:, cols].astype(float)
+
+    # average 4x4 groups of samples -> (hash_size, hash_size + 1) cells
+    cells = samples.reshape(hash_size, 4, hash_size + 1, 4).mean(axis=(1, 3))
+    return cells[:, 1:] > cells[:, :-1]
+
+
+# renditions which can be produced together by one ffmpeg call (`--output-profiles`); height None: keep the size
+OUTPUT_PROFILES = {
+    "1080p": {
+        "height": 1080,
+        "extension": "mp4",
+        "video_args": ["-c:v", "libx264", "-tune", "stillimage", "-crf", "20"],
+        "audio_args": ["-c:a", "aac", "-b:a", "192k"],
+    },
+    "720p": {
+        "height": 720,
+        "extension": "mp4",
+        "video_args": ["-c:v", "libx264", "-tune", "stillimage", "-crf", "22"],
+        "audio_args": ["-c:a", "aac", "-b:a", "192k"],
+    },
+    "480p": {
+        "height": 480,
+        "extension": "mp4",
+        "video_args": ["-c:v", "libx264", "-tune", "stillimage", "-crf", "24"],
+        "audio_args": ["-c:a", "aac", "-b:a", "192k"],
+    },
+    "webm": {
+        "height": None,
+        "extension": "webm",
+        "video_args": ["-c:v", "libvpx-vp9", "-b:v", "0", "-crf", "33", "-row-mt", "1"],
+        "audio_args": ["-c:a", "libopus", "-b:a", "128k"],
+    },
+}
+
+# length of the hls/dash segments in seconds (`--segmented`)
+SEGMENT_DURATION = 6
+
+# recordings longer than this (in seconds) are processed block by block with bounded memory
+STREAMING_THRESHOLD = 300
+
+# maximum number of samples (all files of a batch zero-padded to the longest one) which are denoised together
+# (vectorized) if a project wide noise profile is used; the peak memory of one batch is roughly 60 bytes per
+# sample (i.e. ~250 MB per worker process); longer files are processed block by block
+NOISE_PROFILE_BATCH_SAMPLES = 2**22
+
+# number of samples which are read, scaled and written at once by the loudness normalization
+LOUDNESS_BLOCK_SIZE = 2**20
+
+NOISE_REDUCE_KWARGS = {"stationary": True, "prop_decrease": 0.75}
+
+# pedalboard plugins (class name, keyword arguments)
+PEDALBOARD_SETTINGS = [
+    ("NoiseGate", {"threshold_db": -30, "ratio": 1.5, "release_ms": 250}),
+    ("Compressor", {"threshold_db": -16, "ratio": 2.5}),
+    # ("LowShelfFilter", {"cutoff_frequency_hz": 400, "gain_db": 10, "q": 1}),
+    ("LowShelfFilter", {"cutoff_frequency_hz": 200, "gain_db": 10, "q": 1}),
+    # this leads to clipping
+    # ("Gain", {"gain_db": 10}),
+]
+
+
+def create_pedalboard():
+    import pedalboard as pb
+
+    return pb.Pedalboard([getattr(pb, name)(**kwargs) for name, kwargs in PEDALBOARD_SETTINGS])
+
+
+def get_preprocessing_params() -> dict:
+    """
+    Return all parameters which influence the result of the audio preprocessing (used for caching).
+    """
+    return {
+        "noisereduce": NOISE_REDUCE_KWARGS,
+        "pedalboard": PEDALBOARD_SETTINGS,
+        "streaming_threshold": STREAMING_THRESHOLD,
+        "noise_profile_batch_samples": NOISE_PROFILE_BATCH_SAMPLES,
+    }
+
+
+# the pedalboard is created only once per (worker) process
+_pedalboard = None
+
+
+def get_pedalboard():
+    global _pedalboard
+    if _pedalboard is None:
+        _pedalboard = create_pedalboard()
+    return _pedalboard
+
+
+def preprocess_audio_file(audio_fpath, target_fpath, trim_kwargs=None):
+    """
+    Apply noise reduction and further filtering to one wav file and write the result to `target_fpath`.
+    Return {target_fpath: duration}.
+
+    This is a module level function such that it can be executed in worker processes.
+
+    :param trim_kwargs:     keyword arguments for `dsp.find_speech_bounds` (None: no trimming of silence)
+    """
+    import noisereduce as nr
+
+    rate, audio_data = audio_io.read_wav_mmap(audio_fpath)
+
+    # separate noise file currently not used
+
+    # if the wav was recorded with stereo -> select first channel
+    audio_data = audio_io.mono_view(audio_data)
+    start, stop = get_trim_bounds(audio_data, rate, trim_kwargs)
+
+    if len(audio_data) > STREAMING_THRESHOLD * rate:
+        preprocess_audio_file_streaming(audio_data, rate, target_fpath, trim_bounds=(start, stop))
+        return {target_fpath: (stop - start) / rate}
+
+    reduced_noise_audio = nr.reduce_noise(y=audio_data, sr=rate, **NOISE_REDUCE_KWARGS)
+
+    # perform more Audio filtering
+
+    # Pedalboard expects floating point data
+    # By convention, floating point audio data is normalized to the range of [-1.0,1.0]
+    # https://stackoverflow.com/a/42544738
+
+    rescaled_audio = reduced_noise_audio.astype(np.float32, order='C') / 32768.0
+
+    # reset=True (default): no state (e.g. of the compressor) is carried over from the previous file
+    resulting_audio = get_pedalboard()(rescaled_audio, rate)
+
+    # the noise reduction needs the silent parts (noise estimate) -> trim afterwards
+    audio_io.write_wav(target_fpath, rate, resulting_audio[start:stop])
+    return {target_fpath: (stop - start) / rate}
+
+
+def get_trim_bounds(audio_data, rate, trim_kwargs):
+    """
+    return (start, stop) of the part of the recording which is kept (everything if trim_kwargs is None)
+    """
+    if trim_kwargs is None:
+        return 0, len(audio_data)
+
+    from . import dsp
+
+    return dsp.find_speech_bounds(audio_data, rate, **trim_kwargs)
+
+
+def split_into_batches(items, lengths, max_samples):
+    """
+    Split `items` (in their order) into batches such that `len(batch) * max(lengths of batch) <= max_samples`
+    (an item which is longer than `max_samples` forms its own batch).
+    """
+    batches = []
+    batch = []
+    batch_max_length = 0
+    for item, length in zip(items, lengths):
+        if batch and (len(batch) + 1) * max(batch_max_length, length) > max_samples:
+            batches.append(batch)
+            batch = []
+            batch_max_length = 0
+        batch.append(item)
+        batch_max_length = max(batch_max_length, length)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def preprocess_audio_batch(fpath_pairs, noise_profile, trim_kwargs=None):
+    """
+    Like `preprocess_audio_file` but for a list of (audio_fpath, target_fpath)-pairs which share one
+    `dsp.NoiseProfile`. The noise reduction of all (not too long) files is done in one vectorized step.
+    Return {target_fpath: duration}.
+    """
+
+    durations = {}
+    signals = []
+    target_fpaths = []
+    trim_bounds = []
+    for audio_fpath, target_fpath in fpath_pairs:
+        rate, audio_data = audio_io.read_wav_mmap(audio_fpath)
+        audio_data = audio_io.mono_view(audio_data)
+        assert rate == noise_profile.rate, f"unexpected sample rate: {audio_fpath}"
+
+        start, stop = get_trim_bounds(audio_data, rate, trim_kwargs)
+        durations[target_fpath] = (stop - start) / rate
+        if len(audio_data) > min(STREAMING_THRESHOLD * rate, NOISE_PROFILE_BATCH_SAMPLES):
+            preprocess_audio_file_streaming(
+                audio_data, rate, target_fpath, noise_profile=noise_profile, trim_bounds=(start, stop)
+            )
+        else:
+            signals.append(audio_data)
+            target_fpaths.append(target_fpath)
+            trim_bounds.append((start, stop))
+
+    if not signals:
+        return durations
+
+    reduced_noise_signals = noise_profile.apply(signals, prop_decrease=NOISE_REDUCE_KWARGS["prop_decrease"])
+    for target_fpath, reduced_noise_audio, (start, stop) in zip(target_fpaths, reduced_noise_signals, trim_bounds):
+        rescaled_audio = reduced_noise_audio.astype(np.float32, order='C') / 32768.0
+        resulting_audio = get_pedalboard()(rescaled_audio, noise_profile.rate)
+        audio_io.write_wav(target_fpath, noise_profile.rate, resulting_audio[start:stop])
+    return durations
+
+
+def preprocess_audio_file_streaming(
+    audio_data, rate, target_fpath, block_duration=30, overlap_duration=1, noise_profile=None, trim_bounds=None
+):
+    """
+    Process long recordings block by block such that peak memory does not depend on the length of the file.
+
+    :param audio_data:          mono audio data (memmap or view of a memmap)
+    :param block_duration:      length of the blocks in seconds
+    :param overlap_duration:    additional context (in seconds) on both sides of each block for the noise
+                                reduction; this context is discarded afterwards (no artifacts at block boundaries)
+    :param noise_profile:       optional dsp.NoiseProfile (default: estimate the noise from the file itself)
+    :param trim_bounds:         optional (start, stop): only this part of the recording is processed and written
+    """
+    import noisereduce as nr
+
+    n = len(audio_data)
+    first, last = trim_bounds or (0, n)
+    block_size = int(block_duration * rate)
+    overlap = int(overlap_duration * rate)
+
+    # stationary noise reduction needs one noise estimate for the whole file (otherwise the noise floor would
+    # change from block to block) -> use evenly spaced excerpts (bounded size) instead of the whole signal
+    if noise_profile is None:
+        n_excerpts = 20
+        excerpt_size = min(rate, n // n_excerpts)
+        starts = np.linspace(0, n - excerpt_size, n_excerpts).astype(int)
+        noise_sample = np.concatenate([audio_data[start:start + excerpt_size] for start in starts])
+
+    # the state of the board is carried over from block to block (reset=False) -> continuous output
+    board = create_pedalboard()
+
+    with audio_io.WavWriter(target_fpath, rate) as writer:
+        for start in range(first, last, block_size):
+            stop = min(start + block_size, last)
+            context_start = max(0, start - overlap)
+            context_stop = min(n, stop + overlap)
+
+            # this reads only the pages of the memmap which are needed for the block
+            block = np.asarray(audio_data[context_start:context_stop])
+            if noise_profile is None:
+                reduced_noise_block = nr.reduce_noise(y=block, sr=rate, y_noise=noise_sample, **NOISE_REDUCE_KWARGS)
+            else:
+                prop_decrease = NOISE_REDUCE_KWARGS["prop_decrease"]
+                reduced_noise_block = noise_profile.apply([block], prop_decrease=prop_decrease)[0]
+            reduced_noise_block = reduced_noise_block[start - context_start:stop - context_start]
+
+            rescaled_block = reduced_noise_block.astype(np.float32, order='C') / 32768.0
+            writer.write(board.process(rescaled_block, rate, reset=False))
+            audio_io.release_pages(audio_data)
+
+
+def quote_concat_path(fpath):
+    """
+    return an absolute path quoted for the ffmpeg concat demuxer
+    """
+    fpath = os.path.abspath(fpath).replace("\\", "/")
+    return "'{}'".format(fpath.replace("'", "'\\''"))
+
+
+def get_default_args(project_dir, **overrides) -> argparse.Namespace:
+    """
+    Return the arguments for `MainManager` as `video-script-tool <project_dir>` would create them (defaults of
+    all options), with some of them replaced by `overrides`. This is used by other tools (build, benchmark).
+    """
+    args = argparse.Namespace(
+        project_dir=project_dir,
+        omit_snippet_production=False,
+        only_audio_preprocessing=False,
+        audio_preprocessing=False,
+        snippet_limit=None,
+        jobs=None,
+        render_mode="snippets",
+        noise_profile="per-file",
+        loudness_normalization=False,
+        loudness_target=None,
+        trim_silence=False,
+        trim_threshold=-35.0,
+        trim_padding=0.3,
+        max_image_height=None,
+        output_profiles=None,
+        segmented=None,
+        watch=False,
+        profile=False,
+        cprofile=False,
+    )
+    for key, value in overrides.items():
+        if not hasattr(args, key):
+            msg = f"unknown argument of MainManager: {key}"
+            raise TypeError(msg)
+        setattr(args, key, value)
+    return args
 
 
 def main(project_dir):
@@ -0,0 +1,309 @@
+import numpy as np
+from scipy.signal import stft, istft, fftconvolve, lfilter, get_window
+
+from . import audio_io
+
+
+def magnitude_db(x):
+    """
+    Convert (complex) amplitudes to decibel (keeps single precision).
+    """
+    magnitude = np.abs(x)
+    return 20 * np.log10(magnitude + np.finfo(magnitude.dtype).eps)
+
+
+def amp_to_db(x, top_db=80.0):
+    """
+    Convert (complex) amplitudes to decibel; values more than `top_db` below the maximum (along the last axis)
+    are clipped (same convention as in noisereduce).
+    """
+    x_db = magnitude_db(x)
+    return np.maximum(x_db, np.max(x_db, axis=-1, keepdims=True) - top_db)
+
+
+def smoothing_filter(n_grad_freq, n_grad_time):
+    """
+    Return a normalized 2d triangular filter (freq x time) to smooth a spectral mask.
+    """
+    def triangle(n):
+        return np.concatenate([np.linspace(0, 1, n + 1, endpoint=False), np.linspace(1, 0, n + 2)])[1:-1]
+
+    res = np.outer(triangle(n_grad_freq), triangle(n_grad_time))
+    return res / np.sum(res)
+
+
+def spectrogram(x, n_fft=1024):
+    """
+    Return the stft of x along the last axis (shape of the result: (..., n_freq, n_time)).
+    Parameters are the same as in noisereduce (window length: n_fft, hop length: n_fft // 4).
+    """
+    _, _, res = stft(x, nfft=n_fft, nperseg=n_fft, noverlap=n_fft - n_fft // 4, padded=False, axis=-1)
+    return res
+
+
+def spectrogram_blocks(signal, n_fft=1024, block_frames=4096):
+    """
+    Yield the stft of a (long) 1d signal block by block (shape of every block: (n_freq, <= block_frames)).
+    The concatenation of the blocks (along the time axis) is equal to `spectrogram(signal, n_fft)` in single
+    precision, but only one block of the signal is read at a time (bounded memory for memmaps).
+    """
+    hop_length = n_fft // 4
+    window = get_window("hann", n_fft).astype(np.float32)
+    scale = np.float32(1 / np.sum(window))
+
+    # same frames as `scipy.signal.stft` (half a window of zeros on both sides of the signal)
+    n = len(signal)
+    n_frames = n // hop_length + 1
+    half = n_fft // 2
+    for k0 in range(0, n_frames, block_frames):
+        k1 = min(k0 + block_frames, n_frames)
+        start = k0 * hop_length - half
+        stop = (k1 - 1) * hop_length + n_fft - half
+        chunk = np.zeros(stop - start, dtype=np.float32)
+        chunk[max(start, 0) - start:min(stop, n) - start] = signal[max(start, 0):min(stop, n)]
+        frames = np.lib.stride_tricks.sliding_window_view(chunk, n_fft)[::hop_length]
+        yield (np.fft.rfft(frames * window, axis=-1) * scale).T
+
+
+def inverse_spectrogram(x_stft, n_fft=1024):
+    _, res = istft(x_stft, nfft=n_fft, nperseg=n_fft, noverlap=n_fft - n_fft // 4, time_axis=-1, freq_axis=-2)
+    return res
+
+
+class NoiseProfile:
+    """
+    Spectral profile of stationary noise: mean and standard deviation (in dB) for every frequency bin.
+
+    This implements the stationary spectral gating of noisereduce (`reduce_noise(..., stationary=True)`), but the
+    noise statistics are computed only once (e.g. per project) and then applied to batches of signals.
+    """
+
+    def __init__(
+        self,
+        rate,
+        mean_db,
+        std_db,
+        n_fft=1024,
+        n_std_thresh=1.5,
+        freq_mask_smooth_hz=500,
+        time_mask_smooth_ms=50,
+    ):
+        self.rate = rate
+        self.mean_db = mean_db
+        self.std_db = std_db
+        self.n_fft = n_fft
+        self.hop_length = n_fft // 4
+        self.threshold_db = mean_db + n_std_thresh * std_db
+
+        n_grad_freq = max(1, int(freq_mask_smooth_hz / (rate / (n_fft / 2))))
+        n_grad_time = max(1, int(time_mask_smooth_ms / ((self.hop_length / rate) * 1000)))
+        self.smoothing_filter = smoothing_filter(n_grad_freq, n_grad_time)
+
+    @classmethod
+    def from_signal(cls, noise, rate, **kwargs):
+        """
+        Create the profile from a recording which contains only noise (e.g. `audio/noise/noise.wav`).
+        """
+        noise_db = amp_to_db(spectrogram(np.asarray(noise, dtype=np.float64), kwargs.get("n_fft", 1024)))
+        return cls(rate, np.mean(noise_db, axis=1), np.std(noise_db, axis=1), **kwargs)
+
+    @classmethod
+    def from_quiet_regions(cls, signals, rate, quiet_fraction=0.1, top_db=80.0, **kwargs):
+        """
+        Create the profile from the quietest stft frames (`quiet_fraction` of each signal) of all signals.
+
+        The signals (e.g. memmaps of long recordings) are processed block by block; only one value per stft
+        frame is kept. Therefore the stft of every signal is computed three times: for the maximum of every
+        frequency bin (clipping as in `amp_to_db`), for the level of every frame and for the statistics of
+        the quiet frames.
+        """
+        n_fft = kwargs.get("n_fft", 1024)
+
+        n_quiet_frames = 0
+        sum_db = 0.0
+        sum_sq_db = 0.0
+        for signal in signals:
+            max_db = None
+            for block in spectrogram_blocks(signal, n_fft):
+                block_max_db = np.max(magnitude_db(block), axis=1)
+                max_db = block_max_db if max_db is None else np.maximum(max_db, block_max_db)
+            floor_db = (max_db - top_db)[:, None]
+
+            frame_level = np.concatenate([
+                np.mean(np.maximum(magnitude_db(block), floor_db), axis=0)
+                for block in spectrogram_blocks(signal, n_fft)
+            ])
+            is_quiet = frame_level <= np.quantile(frame_level, quiet_fraction)
+
+            offset = 0
+            for block in spectrogram_blocks(signal, n_fft):
+                block_is_quiet = is_quiet[offset:offset + block.shape[1]]
+                offset += block.shape[1]
+                quiet_db = np.maximum(magnitude_db(block[:, block_is_quiet]), floor_db).astype(np.float64)
+                n_quiet_frames += quiet_db.shape[1]
+                sum_db = sum_db + np.sum(quiet_db, axis=1)
+                sum_sq_db = sum_sq_db + np.sum(quiet_db ** 2, axis=1)
+
+        mean_db = sum_db / n_quiet_frames
+        std_db = np.sqrt(np.maximum(sum_sq_db / n_quiet_frames - mean_db ** 2, 0))
+        return cls(rate, mean_db, std_db, **kwargs)
+
+    def apply(self, signals, prop_decrease=1.0):
+        """
+        Reduce the noise of a list of 1d signals (all with sample rate `self.rate`).
+
+        The signals are zero-padded to a common length such that stft, masking and istft run as one vectorized
+        operation for the whole batch (in single precision; the caller limits the total length of a batch).
+        Return a list of float32 arrays (same scale and length as the input).
+        """
+
+        lengths = [len(signal) for signal in signals]
+
+        # additional zeros at the end such that the last samples are covered by complete stft frames
+        batch = np.zeros((len(signals), max(lengths) + self.n_fft), dtype=np.float32)
+        for k, signal in enumerate(signals):
+            batch[k, :lengths[k]] = signal
+
+        batch_stft = spectrogram(batch, self.n_fft)
+        del batch
+
+        # mask all bins which are not above the noise threshold
+        mask = (amp_to_db(batch_stft) > self.threshold_db[None, :, None]).astype(np.float32)
+        mask *= prop_decrease
+        mask += 1.0 - prop_decrease
+        mask = fftconvolve(
+            mask, self.smoothing_filter[None, :, :].astype(np.float32), mode="same", axes=(1, 2)
+        )
+
+        batch_stft *= mask
+        del mask
+        denoised = inverse_spectrogram(batch_stft, self.n_fft)
+
+        return [denoised[k, :length] for k, length in enumerate(lengths)]
+
+
+
+def k_weighting_filters(rate):
+    """
+    Return the coefficients [(b, a), ...] of the two biquads of the K-weighting filter (ITU-R BS.1770)
+    for an arbitrary sample rate.
+    """
+
+    # stage 1: high shelf (+4 dB above ~1.5 kHz)
+    gain_db, q, fc = 4.0, 1 / np.sqrt(2), 1500.0
+    big_a = 10 ** (gain_db / 40)
+    w0 = 2 * np.pi * fc / rate
+    alpha = np.sin(w0) / (2 * q)
+    cos_w0 = np.cos(w0)
+    sqrt_a = np.sqrt(big_a)
+    b_shelf = big_a * np.array([
+        (big_a + 1) + (big_a - 1) * cos_w0 + 2 * sqrt_a * alpha,
+        -2 * ((big_a - 1) + (big_a + 1) * cos_w0),
+        (big_a + 1) + (big_a - 1) * cos_w0 - 2 * sqrt_a * alpha,
+    ])
+    a_shelf = np.array([
+        (big_a + 1) - (big_a - 1) * cos_w0 + 2 * sqrt_a * alpha,
+        2 * ((big_a - 1) - (big_a + 1) * cos_w0),
+        (big_a + 1) - (big_a - 1) * cos_w0 - 2 * sqrt_a * alpha,
+    ])
+
+    # stage 2: high pass (~38 Hz)
+    q, fc = 0.5, 38.0
+    w0 = 2 * np.pi * fc / rate
+    alpha = np.sin(w0) / (2 * q)
+    cos_w0 = np.cos(w0)
+    b_hp = np.array([(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2])
+    a_hp = np.array([1 + alpha, -2 * cos_w0, 1 - alpha])
+
+    return [(b_shelf / a_shelf[0], a_shelf / a_shelf[0]), (b_hp / a_hp[0], a_hp / a_hp[0])]
+
+
+def integrated_loudness(signal, rate, block_duration=0.4, overlap=0.75, chunk_size=2**20):
+    """
+    Return the integrated loudness (LUFS) of a mono float signal (range [-1, 1]) according to ITU-R BS.1770
+    (K-weighting, 400 ms blocks, absolute gate at -70 LUFS, relative gate at -10 LU).
+
+    The signal (e.g. a memmap) is filtered chunk by chunk (the filter states are carried over); the block
+    energies are computed from the running cumulative sum of the squared samples. Only one chunk and one value
+    per block are kept in memory.
+    """
+
+    n = len(signal)
+    block_size = int(block_duration * rate)
+    step = int(block_size * (1 - overlap))
+    if n < block_size:
+        return -np.inf
+
+    starts = np.arange(0, n - block_size + 1, step)
+    stops = starts + block_size
+
+    # cumulative energy (sum of the squared weighted samples) before the start and the stop of every block
+    cumulative_at_starts = np.zeros(len(starts))
+    cumulative_at_stops = np.zeros(len(stops))
+
+    filters = k_weighting_filters(rate)
+    filter_states = [np.zeros(max(len(a), len(b)) - 1) for b, a in filters]
+    total_energy = 0.0
+    for chunk_start in range(0, n, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, n)
+        weighted = np.asarray(signal[chunk_start:chunk_stop], dtype=np.float64)
+        for k, (b, a) in enumerate(filters):
+            weighted, filter_states[k] = lfilter(b, a, weighted, zi=filter_states[k])
+
+        cumulative_energy = total_energy + np.cumsum(weighted**2)
+        for positions, values in ((starts, cumulative_at_starts), (stops, cumulative_at_stops)):
+            in_chunk = (positions > chunk_start) & (positions <= chunk_stop)
+            values[in_chunk] = cumulative_energy[positions[in_chunk] - chunk_start - 1]
+        total_energy = cumulative_energy[-1]
+        audio_io.release_pages(signal)
+
+    block_energy = (cumulative_at_stops - cumulative_at_starts) / block_size
+    block_loudness = -0.691 + 10 * np.log10(block_energy + np.finfo(np.float64).tiny)
+
+    gated_energy = block_energy[block_loudness > -70]
+    if len(gated_energy) == 0:
+        return -np.inf
+    relative_threshold = -0.691 + 10 * np.log10(np.mean(gated_energy)) - 10
+    gated_energy = block_energy[(block_loudness > -70) & (block_loudness > relative_threshold)]
+    return -0.691 + 10 * np.log10(np.mean(gated_energy))
+
+
+def peak_amplitude(signal, chunk_size=2**20):
+    """
+    Return the maximum absolute value of a signal (e.g. a memmap; read chunk by chunk).
+    """
+    peak = 0.0
+    for chunk_start in range(0, len(signal), chunk_size):
+        peak = max(peak, float(np.max(np.abs(signal[chunk_start:chunk_start + chunk_size]))))
+        audio_io.release_pages(signal)
+    return peak
+
+
+def find_speech_bounds(signal, rate, threshold_db=-35.0, padding=0.3, frame_duration=0.02, chunk_frames=2**14):
+    """
+    Return (start, stop) sample indices such that signal[start:stop] contains everything between the first and
+    the last frame whose energy is at most `-threshold_db` dB below that of the loudest frame, extended by
+    `padding` seconds on both sides. For a completely silent signal the whole range is returned.
+
+    The frame energies are computed chunk by chunk (bounded memory for memmaps of long recordings).
+    """
+    frame_size = max(1, int(frame_duration * rate))
+    n_frames = len(signal) // frame_size
+    if n_frames == 0:
+        return 0, len(signal)
+
+    energies = np.empty(n_frames)
+    for k in range(0, n_frames, chunk_frames):
+        stop = min(k + chunk_frames, n_frames)
+        frames = np.asarray(signal[k * frame_size:stop * frame_size], dtype=np.float64).reshape(stop - k, frame_size)
+        energies[k:stop] = np.mean(frames ** 2, axis=1)
+
+    max_energy = np.max(energies)
+    if max_energy == 0:
+        return 0, len(signal)
+
+    active_frames = np.flatnonzero(energies >= max_energy * 10 ** (threshold_db / 10))
+    padding_size = int(padding * rate)
+    start = max(0, active_frames[0] * frame_size - padding_size)
+    stop = min(len(signal), (active_frames[-1] + 1) * frame_size + padding_size)
+    return int(start), int(stop)
@@ -39,8 +39,6 @@ from .util import bred, PyaudioStdoutWrapper
 from .release import __version__
 
 
-from ipydex import IPS
-
 pjoin = os.path.join
 
 # to mute logging noise for pyaudio
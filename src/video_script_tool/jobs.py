@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from . import util
+
+
+class FFmpegJob:
+    """
+    One ffmpeg invocation (argument list, no shell). While the job runs, the output of `-progress pipe:1` is
+    parsed into live figures (fps, speed, encoded time). After the job ended, wall time and cpu time
+    (user + system of the ffmpeg process) are available.
+    """
+
+    def __init__(self, cmd_list, label, duration=None, description=""):
+        assert cmd_list[0] == "ffmpeg"
+        self.cmd_list = cmd_list
+        self.label = label
+
+        # additional information (e.g. the input files) for error messages
+        self.description = description
+
+        # expected duration of the output in seconds (only used to display the progress)
+        self.duration = duration
+
+        self.process = None
+        self.returncode = None
+        self.stderr = ""
+        self.cancelled = False
+
+        self.fps = None
+        self.speed = None
+        self.out_time = 0.0
+        self.wall_time = None
+        self.cpu_time = None
+
+    def get_full_cmd_list(self):
+        # machine readable progress information on stdout; human readable statistics are not needed
+        return [self.cmd_list[0], "-nostdin", "-progress", "pipe:1", "-nostats", *self.cmd_list[1:]]
+
+    def run(self, on_progress=None):
+        if self.cancelled:
+            return self
+
+        start = time.perf_counter()
+        self.process = subprocess.Popen(
+            self.get_full_cmd_list(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+
+        # drain stderr in parallel (otherwise ffmpeg might block on a full pipe)
+        stderr_lines = []
+        stderr_thread = threading.Thread(target=lambda: stderr_lines.extend(self.process.stderr))
+        stderr_thread.start()
+
+        for line in self.process.stdout:
+            key, _, value = line.strip().partition("=")
+            self._handle_progress_item(key, value)
+            if key == "progress" and on_progress is not None:
+                on_progress(self)
+
+        stderr_thread.join()
+        self.stderr = "".join(stderr_lines)
+
+        try:
+            # this gives the resource usage of the child process
+            _, status, rusage = os.wait4(self.process.pid, 0)
+        except (AttributeError, ChildProcessError):
+            # no wait4 on this platform or the process was already reaped (`terminate` polls on cancellation)
+            self.process.wait()
+        else:
+            self.process.returncode = os.waitstatus_to_exitcode(status)
+            self.cpu_time = rusage.ru_utime + rusage.ru_stime
+
+        self.returncode = self.process.returncode
+        self.wall_time = time.perf_counter() - start
+        return self
+
+    def _handle_progress_item(self, key, value):
+        try:
+            if key == "fps":
+                self.fps = float(value)
+            elif key == "speed" and value.endswith("x"):
+                self.speed = float(value[:-1])
+            elif key == "out_time_us":
+                self.out_time = int(value) / 1e6
+        except ValueError:
+            # ffmpeg reports "N/A" at the beginning
+            pass
+
+    def cancel(self):
+        self.cancelled = True
+        # no `poll` here: the worker thread reaps the process itself (see `run`)
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+
+    @property
+    def failed(self):
+        return self.cancelled or self.returncode != 0
+
+    def get_status_str(self):
+        if self.duration:
+            percent = f"{min(100, 100 * self.out_time / self.duration):3.0f}%"
+        else:
+            percent = f"{self.out_time:.1f}s"
+        return f"{self.label}: {percent} {self.fps or 0:.0f} fps {self.speed or 0:.2f}x"
+
+
+class JobRunner:
+    """
+    Run ffmpeg jobs with bounded concurrency, show their progress and collect timing information.
+    """
+
+    def __init__(self, max_workers=1, show_progress=None):
+        self.max_workers = max_workers
+        if show_progress is None:
+            show_progress = sys.stdout.isatty()
+        self.show_progress = show_progress
+
+        self.running_jobs = []
+        self.finished_jobs = []
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._last_status_time = 0
+
+        # number of started subprocesses (over all calls of `run`)
+        self.n_spawned = 0
+
+    def run(self, jobs):
+        """
+        Run all jobs and return them (in the original order). Failed jobs are not retried; use `job.failed`.
+        """
+
+        def run_job(job):
+            with self._lock:
+                if self.cancelled:
+                    job.cancel()
+                    return job
+                self.running_jobs.append(job)
+                self.n_spawned += 1
+            try:
+                job.run(on_progress=self._print_status)
+            finally:
+                with self._lock:
+                    self.running_jobs.remove(job)
+                    self.finished_jobs.append(job)
+            return job
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                res = list(executor.map(run_job, jobs))
+            except KeyboardInterrupt:
+                self.cancel()
+                raise
+        if self.show_progress:
+            # finish the status line
+            print()
+        return res
+
+    def cancel(self):
+        """
+        Terminate all running jobs and skip the pending ones.
+        """
+        with self._lock:
+            self.cancelled = True
+            for job in self.running_jobs:
+                job.cancel()
+
+    def _print_status(self, job):
+        if not self.show_progress:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            if now - self._last_status_time < 0.5:
+                return
+            self._last_status_time = now
+            status = " | ".join(job.get_status_str() for job in self.running_jobs)
+            print(f"\r\033[K{status}", end="", flush=True)
+
+    def print_timing_report(self, n_slowest=5):
+        jobs = [job for job in self.finished_jobs if job.wall_time is not None]
+        if not jobs:
+            return
+        total_wall = sum(job.wall_time for job in jobs)
+        total_cpu = sum(job.cpu_time or 0 for job in jobs)
+        print(util.bright(f"{len(jobs)} ffmpeg jobs: {total_wall:.1f} s wall time, {total_cpu:.1f} s cpu time (sum)"))
+        for job in sorted(jobs, key=lambda job: job.wall_time, reverse=True)[:n_slowest]:
+            cpu_time = f"{job.cpu_time:.1f}" if job.cpu_time is not None else "?"
+            print(f"  {job.label}: {job.wall_time:.1f} s wall, {cpu_time} s cpu, speed {job.speed or 0:.2f}x")
@@ -1,4 +1,3 @@
-import requests
 import os
 import re
 import time
@@ -6,10 +5,21 @@ import glob
 
 from . import util
 
-from ipydex import IPS
-
 pjoin = os.path.join
 
+
+def split_slide_sources(slides_full_source) -> list:
+    """
+    split the markdown source of a presentation into the sources of the (horizontal) slides
+    """
+    slide_src_list = slides_full_source.split("\n\n---\n\n")
+
+    # ignore optional slideOptions
+    if "\nslideOptions:\n" in slide_src_list[0]:
+        slide_src_list.pop(0)
+    return slide_src_list
+
+
 class TextExtractor:
 
     def __init__(self, args):
@@ -48,7 +58,7 @@ class TextExtractor:
                 self.slides_full_source = fp.read()
             return
 
-        if os.path.isfile(self.slides_full_source_fpath):
+        if os.path.isfile(self.slides_full_source_fpath) and not self.force_reload:
             stat = os.stat(self.slides_full_source_fpath)
 
             # just load cached file
@@ -67,6 +77,9 @@ class TextExtractor:
         else:
             url = f'{self.url.rstrip("/").rstrip("#")}/download'
 
+        # imported here because it is only needed if the source is not cached
+        import requests
+
         print(f"Downloading {url}")
         res = requests.get(url)
         if not res.status_code == 200:
@@ -81,17 +94,13 @@ class TextExtractor:
 
     def split_into_slides(self):
 
-        self.slide_src_list = self.slides_full_source.split("\n\n---\n\n")
+        self.slide_src_list = split_slide_sources(self.slides_full_source)
 
         if 0:
             with open(pjoin(self.project_dir, "debug.md"), "w") as fp:
                 for k, slide in enumerate(self.slide_src_list):
                     fp.write(f"\n\n\n::::::: {k}\n\n{slide}")
 
-        # ignore optional slideOptions
-        if "\nslideOptions:\n" in self.slide_src_list[0]:
-            self.slide_src_list.pop(0)
-
         # find out how much fragments each slide should have, based on the image filenames
         pattern_img = os.path.join(self.project_dir, self.image_dir, "*.png")
         self.image_files = glob.glob(pattern_img)
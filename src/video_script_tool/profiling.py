@@ -0,0 +1,96 @@
+"""
+Per-stage measurement of wall time, cpu time, i/o and spawned subprocesses (see `video-script-tool --profile`).
+"""
+
+import os
+import json
+import time
+import cProfile
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+from . import util
+
+
+class StageProfiler:
+    """
+    Measure the stages of a run (context manager `stage`) and write a json report at the end.
+
+    cpu time and block i/o include all terminated child processes (ffmpeg, worker processes). The i/o figures
+    count the bytes which actually hit the disk (reads served by the page cache are not included).
+    """
+
+    def __init__(self, report_fpath, use_cprofile=False, get_n_spawned=None):
+        self.report_fpath = report_fpath
+        self.use_cprofile = use_cprofile
+
+        # callable which returns the number of subprocesses spawned so far
+        self.get_n_spawned = get_n_spawned or (lambda: 0)
+
+        self.stages = []
+
+    def _get_counters(self):
+        counters = {"wall_time": time.perf_counter(), "n_spawned": self.get_n_spawned()}
+        if resource is None:
+            times = os.times()
+            counters["cpu_time"] = times.user + times.system
+            return counters
+
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        counters["cpu_time"] = sum(
+            usage.ru_utime + usage.ru_stime for usage in (self_usage, children_usage)
+        )
+        # the block counts are in units of 512 bytes
+        counters["bytes_read"] = 512 * (self_usage.ru_inblock + children_usage.ru_inblock)
+        counters["bytes_written"] = 512 * (self_usage.ru_oublock + children_usage.ru_oublock)
+        return counters
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        profile = None
+        if self.use_cprofile:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        start = self._get_counters()
+        try:
+            yield
+        finally:
+            end = self._get_counters()
+            if profile is not None:
+                profile.disable()
+                prof_fpath = self.get_cprofile_fpath(name)
+                profile.dump_stats(prof_fpath)
+            else:
+                prof_fpath = None
+
+            stage_data = {"name": name}
+            for key, value in start.items():
+                stage_data[key] = end[key] - value
+            stage_data["cprofile_fpath"] = prof_fpath
+            self.stages.append(stage_data)
+
+    def get_cprofile_fpath(self, name):
+        dirpath = os.path.join(os.path.dirname(self.report_fpath), "profile")
+        os.makedirs(dirpath, exist_ok=True)
+        return os.path.join(dirpath, f"{len(self.stages) + 1:02d}_{name}.prof")
+
+    def write_report(self):
+        with open(self.report_fpath, "w") as fp:
+            json.dump({"stages": self.stages}, fp, indent=2)
+            fp.write("\n")
+
+        print(util.bright("stage timing:"))
+        for stage_data in self.stages:
+            line = f"  {stage_data['name']:>22}: {stage_data['wall_time']:8.2f} s wall, {stage_data['cpu_time']:8.2f} s cpu"
+            if "bytes_read" in stage_data:
+                line += f", {stage_data['bytes_read'] / 1e6:8.1f} MB read, {stage_data['bytes_written'] / 1e6:8.1f} MB written"
+            line += f", {stage_data['n_spawned']} subprocesses"
+            print(line)
+        print(f"File written: {self.report_fpath}")
@@ -1,12 +1,73 @@
 import subprocess
 import os
-from pyaudio import PyAudio
+import json
+import glob
+import hashlib
 from collections import defaultdict
+from typing import TYPE_CHECKING
 
 
 from colorama import Style, Fore
 
+if TYPE_CHECKING:
+    # only for the annotation (pyaudio itself is imported in `PyaudioStdoutWrapper.__enter__`)
+    from pyaudio import PyAudio
+
+# cache for audio durations; key: (absolute path, mtime, size)
+_audio_duration_cache = {}
+
+
 def get_audio_duration(audio_file):
+    """
+    Return the duration of an audio file in seconds.
+
+    For wav files the duration is read from the RIFF header (in-process), other formats are handled by ffprobe.
+    Results are cached (the cache is invalidated if mtime or size of the file change).
+    """
+
+    stat = os.stat(audio_file)
+    key = (os.path.abspath(audio_file), stat.st_mtime_ns, stat.st_size)
+    duration = _audio_duration_cache.get(key)
+    if duration is None:
+        duration = read_wav_duration(audio_file)
+        if duration is None:
+            duration = get_audio_duration_ffprobe(audio_file)
+        _audio_duration_cache[key] = duration
+    return duration
+
+
+def register_audio_duration(audio_file, duration):
+    """
+    Store an already known duration (e.g. of a file which was just written) in the cache of `get_audio_duration`.
+    """
+    stat = os.stat(audio_file)
+    _audio_duration_cache[(os.path.abspath(audio_file), stat.st_mtime_ns, stat.st_size)] = duration
+
+
+def get_audio_durations(audio_dir, pattern="*.wav") -> dict:
+    """
+    Return a dict {fpath: duration} for all matching files of a directory (sorted by path).
+    """
+    fpaths = sorted(glob.glob(os.path.join(audio_dir, pattern)))
+    return {fpath: get_audio_duration(fpath) for fpath in fpaths}
+
+
+def read_wav_duration(fpath):
+    """
+    Return the duration in seconds from the RIFF header of a wav file
+    (or None if the file is not a wav file which can be handled here).
+    """
+
+    # same header parser as for the memory mapped access to the samples
+    from . import audio_io
+
+    header = audio_io.read_wav_header(fpath)
+    if header is None:
+        return None
+    return header.duration
+
+
+def get_audio_duration_ffprobe(audio_file):
     result = subprocess.run(
         [
             "ffprobe",
@@ -24,6 +85,52 @@ def get_audio_duration(audio_file):
     return float(result.stdout)
 
 
+def get_content_hash(*fpaths, extra=None) -> str:
+    """
+    return the sha256 hexdigest over the content of all given files and (optionally) over the json
+    representation of `extra` (e.g. a list of command line arguments)
+    """
+    hasher = hashlib.sha256()
+    for fpath in fpaths:
+        with open(fpath, "rb") as fp:
+            for block in iter(lambda: fp.read(2**20), b""):
+                hasher.update(block)
+        # separate the files such that (ab, c) and (a, bc) do not collide
+        hasher.update(b"\0")
+    if extra is not None:
+        hasher.update(json.dumps(extra, sort_keys=True).encode("utf8"))
+    return hasher.hexdigest()
+
+
+class HashManifest:
+    """
+    Json file which maps the names of generated files to the hash of their inputs.
+    This allows to reuse files whose inputs did not change since the last run.
+    """
+
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.data = {}
+        if os.path.isfile(self.fpath):
+            with open(self.fpath, "r") as fp:
+                self.data = json.load(fp)
+
+    def is_up_to_date(self, target_fpath, hash_value) -> bool:
+        key = os.path.basename(target_fpath)
+        return self.data.get(key) == hash_value and os.path.isfile(target_fpath)
+
+    def update(self, target_fpath, hash_value):
+        self.data[os.path.basename(target_fpath)] = hash_value
+
+    def remove(self, target_fpath):
+        self.data.pop(os.path.basename(target_fpath), None)
+
+    def save(self):
+        with open(self.fpath, "w") as fp:
+            json.dump(self.data, fp, indent=2, sort_keys=True)
+            fp.write("\n")
+
+
 # this is heavily based on https://stackoverflow.com/a/67962563
 class PyaudioStdoutWrapper:
     """
@@ -47,7 +154,9 @@ class PyaudioStdoutWrapper:
 
         self.pyaudio = None
 
-    def __enter__(self) -> PyAudio:
+    def __enter__(self) -> "PyAudio":
+        # imported here such that modules which only need other helpers of util do not pay for pyaudio
+        from pyaudio import PyAudio
 
         # Assign the null pointers to stdout and stderr.
         os.dup2(self.null_fds[0], 1)
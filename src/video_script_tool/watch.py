@@ -0,0 +1,63 @@
+"""
+Polling based file watcher (no additional dependencies, works the same on all platforms).
+"""
+
+import os
+import glob
+
+
+class DirectoryPoller:
+    """
+    Report new, changed and removed files in some directories.
+
+    A new or changed file is only reported once its size and mtime did not change between two polls (i.e. it is
+    not being written anymore, e.g. by the recording gui).
+    """
+
+    def __init__(self, dirpaths, patterns=("*.wav", "*.png")):
+        self.dirpaths = dirpaths
+        self.patterns = patterns
+
+        # {fpath: (mtime_ns, size)} of the last reported state
+        self.known = self.scan()
+
+        # files which changed but were still being written at the last poll
+        self.unstable = {}
+
+    def scan(self):
+        state = {}
+        for dirpath in self.dirpaths:
+            for pattern in self.patterns:
+                for fpath in glob.glob(os.path.join(dirpath, pattern)):
+                    try:
+                        stat = os.stat(fpath)
+                    except FileNotFoundError:
+                        # removed in the meantime
+                        continue
+                    state[fpath] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def poll(self):
+        """
+        return (changed_fpaths, removed_fpaths) since the last call (changed includes new files)
+        """
+        current = self.scan()
+        changed = []
+        for fpath, signature in current.items():
+            if self.known.get(fpath) == signature:
+                self.unstable.pop(fpath, None)
+                continue
+            if self.unstable.get(fpath) == signature:
+                # unchanged since the last poll -> writing is finished
+                del self.unstable[fpath]
+                self.known[fpath] = signature
+                changed.append(fpath)
+            else:
+                self.unstable[fpath] = signature
+
+        removed = [fpath for fpath in self.known if fpath not in current]
+        for fpath in removed:
+            del self.known[fpath]
+            self.unstable.pop(fpath, None)
+
+        return sorted(changed), sorted(removed)